@@ -28,6 +28,7 @@ const BUILTIN_DEFAULTS = {
     redirect_uri: 'http://localhost:8485/callback',
     scopes: 'user.metrics,user.activity',
     overlap_seconds: 300,
+    min_poll_interval_seconds: 60,
     meastypes: null,
   },
   hevy: {
@@ -216,6 +217,11 @@ export function loadConfig(configPath) {
   cfg.withings.redirect_uri = getStr(withings, 'redirect_uri', cfg.withings.redirect_uri);
   cfg.withings.scopes = getStr(withings, 'scopes', cfg.withings.scopes);
   cfg.withings.overlap_seconds = getInt(withings, 'overlap_seconds', cfg.withings.overlap_seconds);
+  cfg.withings.min_poll_interval_seconds = getInt(
+    withings,
+    'min_poll_interval_seconds',
+    cfg.withings.min_poll_interval_seconds,
+  );
   cfg.withings.meastypes = getListStr(withings, 'meastypes', cfg.withings.meastypes);
 
   const hevy = section(raw, 'hevy');
@@ -3,6 +3,7 @@ import path from 'node:path';
 import Database from 'better-sqlite3';
 import {
   dtToIsoZ,
+  epochToIsoZ,
   isoToDate,
   stableJsonStringify,
   toEpochSeconds,
@@ -27,18 +28,25 @@ function normalizeTimestamp(value) {
   }
   const epoch = toEpochSeconds(value);
   if (epoch !== null) {
-    return dtToIsoZ(new Date(epoch * 1000));
+    return epochToIsoZ(epoch);
   }
   return dtToIsoZ(value);
 }
 
+function normalizeExpiryEpoch(storedEpoch, expiresAt) {
+  if (typeof storedEpoch === 'number' && Number.isFinite(storedEpoch)) {
+    return Math.floor(storedEpoch);
+  }
+  return expiresAt ? toEpochSeconds(expiresAt) : null;
+}
+
 function normalizeWatermark(value) {
   if (value === null || value === undefined || value === '') {
     return null;
   }
 
   if (typeof value === 'number' && Number.isFinite(value)) {
-    return dtToIsoZ(new Date(Math.floor(value) * 1000));
+    return epochToIsoZ(value);
   }
 
   if (value instanceof Date) {
@@ -56,7 +64,7 @@ function normalizeWatermark(value) {
 
   if (/^\d+$/.test(trimmed)) {
     const epoch = Number.parseInt(trimmed, 10);
-    return dtToIsoZ(new Date(epoch * 1000));
+    return epochToIsoZ(epoch);
   }
 
   if (/^\d{4}-\d{2}-\d{2}$/.test(trimmed)) {
@@ -78,13 +86,21 @@ export class HealthSyncDb {
     );
     this.conn = new Database(this.path);
     this.conn.pragma('journal_mode = WAL');
+    this.conn.pragma('synchronous = NORMAL');
+    this.conn.pragma('busy_timeout = 30000');
+    this.conn.pragma('wal_autocheckpoint = 1000');
+    this.conn.pragma('temp_store = MEMORY');
     this.conn.pragma('foreign_keys = ON');
+    this.conn.pragma('cache_size = -65536');
+    this.conn.pragma('mmap_size = 268435456');
     this._runStatsStack = [];
     this._transactionDepth = 0;
     this._oauthMigrated = false;
     this._credsParseWarned = false;
     this._stmtCache = new Map();
     this._syncRunLocks = new Map();
+    this._accessTokenCache = new Map();
+    this._syncStateCache = new Map();
     const parsedStaleMaxAge = Number.parseInt(String(options.staleSyncRunMaxAgeSeconds ?? 21600), 10);
     this._staleSyncRunMaxAgeSeconds = Number.isFinite(parsedStaleMaxAge)
       ? Math.max(0, parsedStaleMaxAge)
@@ -120,6 +136,7 @@ export class HealthSyncDb {
         provider TEXT NOT NULL,
         resource TEXT NOT NULL,
         watermark TEXT,
+        watermark_epoch INTEGER,
         cursor TEXT,
         extra_json TEXT,
         updated_at TEXT NOT NULL,
@@ -160,6 +177,7 @@ export class HealthSyncDb {
         ON sync_runs(status, started_at DESC);
     `);
 
+    this._ensureColumn('sync_state', 'watermark_epoch', 'INTEGER');
     this._normalizeLegacyTimestamps();
     this.reconcileStaleSyncRuns();
     this._migrateOAuthTokensToCredsFile();
@@ -174,6 +192,13 @@ export class HealthSyncDb {
     return stmt;
   }
 
+  _ensureColumn(table, column, type) {
+    const columns = this.conn.prepare(`PRAGMA table_info(${table})`).all();
+    if (!columns.some((col) => col.name === column)) {
+      this.conn.exec(`ALTER TABLE ${table} ADD COLUMN ${column} ${type}`);
+    }
+  }
+
   _normalizeLegacyTimestamps() {
     const normalizeTableCols = [
       ['records', ['start_time', 'end_time', 'source_updated_at', 'fetched_at']],
@@ -269,13 +294,15 @@ export class HealthSyncDb {
       extra = jsonLoadsOrNull(rawToken.extra_json, `${contextLabel}.extra_json`);
     }
 
+    const expiresAt = normalizeTimestamp(rawToken.expiresAt ?? rawToken.expires_at);
     return {
       provider,
       accessToken: String(accessTokenValue),
       refreshToken: rawToken.refreshToken ?? rawToken.refresh_token ?? null,
       tokenType: rawToken.tokenType ?? rawToken.token_type ?? null,
       scope: rawToken.scope ?? null,
-      expiresAt: normalizeTimestamp(rawToken.expiresAt ?? rawToken.expires_at),
+      expiresAt,
+      expiresAtEpoch: normalizeExpiryEpoch(rawToken.expiresAtEpoch, expiresAt),
       obtainedAt: normalizeTimestamp(rawToken.obtainedAt ?? rawToken.obtained_at),
       extra,
     };
@@ -322,6 +349,7 @@ export class HealthSyncDb {
         tokenType: token.tokenType,
         scope: token.scope,
         expiresAt: token.expiresAt,
+        expiresAtEpoch: token.expiresAtEpoch,
         obtainedAt: token.obtainedAt,
         extra: token.extra,
       },
@@ -355,6 +383,7 @@ export class HealthSyncDb {
         tokenType: token.tokenType,
         scope: token.scope,
         expiresAt: token.expiresAt,
+        expiresAtEpoch: token.expiresAtEpoch,
         obtainedAt: token.obtainedAt,
         extra: token.extra,
       };
@@ -417,37 +446,36 @@ export class HealthSyncDb {
     this._incrementRunStats(entry.stats, op, count);
   }
 
-  upsertRecord(
-    {
-      provider,
-      resource,
-      recordId,
-      startTime = null,
-      endTime = null,
-      sourceUpdatedAt = null,
-      payload,
-    },
-    trackTarget = null,
-  ) {
-    const payloadJson = stableJsonStringify(payload);
+  _upsertRecordRow({
+    provider,
+    resource,
+    recordId,
+    startTime = null,
+    endTime = null,
+    sourceUpdatedAt = null,
+    payload,
+    payloadJson = null,
+  }, fetchedAt, existingRows = null) {
+    const serializedPayload = payloadJson ?? stableJsonStringify(payload);
     const normalizedStart = normalizeTimestamp(startTime);
     const normalizedEnd = normalizeTimestamp(endTime);
     const normalizedUpdated = normalizeTimestamp(sourceUpdatedAt);
-    const fetchedAt = utcNowIso();
 
-    const existing = this._stmt(
-      'records.select_for_upsert',
-      `
-        SELECT payload_json, start_time, end_time, source_updated_at
-        FROM records
-        WHERE provider = ? AND resource = ? AND record_id = ?
-      `,
-    ).get(provider, resource, recordId);
+    const existing = existingRows
+      ? existingRows.get(String(recordId))
+      : this._stmt(
+        'records.select_for_upsert',
+        `
+          SELECT payload_json, start_time, end_time, source_updated_at
+          FROM records
+          WHERE provider = ? AND resource = ? AND record_id = ?
+        `,
+      ).get(provider, resource, recordId);
 
     let op = 'inserted';
     if (existing) {
       if (
-        existing.payload_json === payloadJson
+        existing.payload_json === serializedPayload
         && existing.start_time === normalizedStart
         && existing.end_time === normalizedEnd
         && existing.source_updated_at === normalizedUpdated
@@ -483,14 +511,73 @@ export class HealthSyncDb {
       start_time: normalizedStart,
       end_time: normalizedEnd,
       source_updated_at: normalizedUpdated,
-      payload_json: payloadJson,
+      payload_json: serializedPayload,
       fetched_at: fetchedAt,
     });
+    if (existingRows) {
+      existingRows.set(String(recordId), {
+        payload_json: serializedPayload,
+        start_time: normalizedStart,
+        end_time: normalizedEnd,
+        source_updated_at: normalizedUpdated,
+      });
+    }
 
+    return op;
+  }
+
+  _existingRecordsById(provider, resource, recordIds) {
+    const rows = this._stmt(
+      'records.select_many_for_upsert',
+      `
+        SELECT record_id, payload_json, start_time, end_time, source_updated_at
+        FROM records
+        WHERE provider = ? AND resource = ?
+          AND record_id IN (SELECT value FROM json_each(?))
+      `,
+    ).all(provider, resource, JSON.stringify(recordIds));
+    return new Map(rows.map((row) => [row.record_id, row]));
+  }
+
+  upsertRecord(record, trackTarget = null) {
+    const op = this._upsertRecordRow(record, utcNowIso());
     this._trackOperation(op, trackTarget);
     return op;
   }
 
+  upsertRecords(records, trackTarget = null) {
+    const counts = { inserted: 0, updated: 0, unchanged: 0 };
+    if (!records?.length) {
+      return counts;
+    }
+    const idsByTarget = new Map();
+    for (const record of records) {
+      const targetKey = `${record.provider}\u0000${record.resource}`;
+      let target = idsByTarget.get(targetKey);
+      if (!target) {
+        target = { provider: record.provider, resource: record.resource, recordIds: [] };
+        idsByTarget.set(targetKey, target);
+      }
+      target.recordIds.push(String(record.recordId));
+    }
+    const existingByTarget = new Map();
+    for (const [targetKey, { provider, resource, recordIds }] of idsByTarget) {
+      existingByTarget.set(targetKey, this._existingRecordsById(provider, resource, recordIds));
+    }
+
+    const fetchedAt = utcNowIso();
+    for (const record of records) {
+      const existingRows = existingByTarget.get(`${record.provider}\u0000${record.resource}`);
+      counts[this._upsertRecordRow(record, fetchedAt, existingRows)] += 1;
+    }
+    for (const [op, count] of Object.entries(counts)) {
+      if (count > 0) {
+        this._trackOperation(op, trackTarget, count);
+      }
+    }
+    return counts;
+  }
+
   deleteRecord(provider, resource, recordId, trackTarget = null) {
     const result = this._stmt(
       'records.delete',
@@ -524,6 +611,10 @@ export class HealthSyncDb {
   }
 
   getSyncState(provider, resource) {
+    const cacheKey = this._syncRunKey(provider, resource);
+    if (this._syncStateCache.has(cacheKey)) {
+      return this._syncStateCache.get(cacheKey);
+    }
     const row = this._stmt(
       'sync_state.get',
       'SELECT * FROM sync_state WHERE provider = ? AND resource = ?',
@@ -531,10 +622,16 @@ export class HealthSyncDb {
     if (!row) {
       return null;
     }
+    const watermark = normalizeWatermark(row.watermark);
+    // The text watermark is authoritative: a writer that only knows that
+    // column (an older binary on the same DB) leaves watermark_epoch stale.
+    const epochMatches = row.watermark_epoch !== null && row.watermark_epoch !== undefined
+      && epochToIsoZ(row.watermark_epoch) === watermark;
     return {
       provider: row.provider,
       resource: row.resource,
-      watermark: normalizeWatermark(row.watermark),
+      watermark,
+      watermarkEpoch: epochMatches ? row.watermark_epoch : (watermark ? toEpochSeconds(watermark) : null),
       cursor: row.cursor,
       extra: jsonLoadsOrNull(row.extra_json, `sync_state.${provider}.${resource}.extra_json`),
       updatedAt: normalizeTimestamp(row.updated_at) || row.updated_at,
@@ -558,17 +655,22 @@ export class HealthSyncDb {
 
   setSyncState(provider, resource, { watermark = null, cursor = null, extra = null } = {}) {
     const normalizedWatermark = normalizeWatermark(watermark);
+    const watermarkEpoch = typeof watermark === 'number' && Number.isFinite(watermark)
+      ? Math.floor(watermark)
+      : toEpochSeconds(normalizedWatermark);
     const updatedAt = utcNowIso();
     const extraJson = extra === null || extra === undefined ? null : stableJsonStringify(extra);
 
+    this._syncStateCache.delete(this._syncRunKey(provider, resource));
     this._stmt(
       'sync_state.upsert',
       `
-      INSERT INTO sync_state (provider, resource, watermark, cursor, extra_json, updated_at)
-      VALUES (@provider, @resource, @watermark, @cursor, @extra_json, @updated_at)
+      INSERT INTO sync_state (provider, resource, watermark, watermark_epoch, cursor, extra_json, updated_at)
+      VALUES (@provider, @resource, @watermark, @watermark_epoch, @cursor, @extra_json, @updated_at)
       ON CONFLICT(provider, resource)
       DO UPDATE SET
         watermark = excluded.watermark,
+        watermark_epoch = excluded.watermark_epoch,
         cursor = excluded.cursor,
         extra_json = excluded.extra_json,
         updated_at = excluded.updated_at
@@ -577,6 +679,7 @@ export class HealthSyncDb {
       provider,
       resource,
       watermark: normalizedWatermark,
+      watermark_epoch: watermarkEpoch,
       cursor,
       extra_json: extraJson,
       updated_at: updatedAt,
@@ -624,6 +727,33 @@ export class HealthSyncDb {
     return legacy;
   }
 
+  cachedAccessToken(provider, skewSeconds = 60) {
+    const entry = this._accessTokenCache.get(provider);
+    if (!entry) {
+      return null;
+    }
+    if (entry.validUntilEpoch - (Date.now() / 1000) > skewSeconds) {
+      return entry.accessToken;
+    }
+    this._accessTokenCache.delete(provider);
+    return null;
+  }
+
+  cacheAccessToken(provider, accessToken, expiresAtEpoch = null, maxTtlSeconds = 600) {
+    const ttlLimitEpoch = Math.floor(Date.now() / 1000) + maxTtlSeconds;
+    const validUntilEpoch = Number.isFinite(expiresAtEpoch)
+      ? Math.min(expiresAtEpoch, ttlLimitEpoch)
+      : ttlLimitEpoch;
+    this._accessTokenCache.set(provider, {
+      accessToken: String(accessToken),
+      validUntilEpoch,
+    });
+  }
+
+  invalidateAccessToken(provider) {
+    this._accessTokenCache.delete(provider);
+  }
+
   setOAuthToken(provider, {
     accessToken,
     refreshToken = null,
@@ -638,18 +768,24 @@ export class HealthSyncDb {
 
     this._migrateOAuthTokensToCredsFile();
 
+    const normalizedExpiresAt = normalizeTimestamp(expiresAt);
     const token = {
       provider,
       accessToken: String(accessToken),
       refreshToken: refreshToken === undefined ? null : refreshToken,
       tokenType: tokenType === undefined ? null : tokenType,
       scope: scope === undefined ? null : scope,
-      expiresAt: normalizeTimestamp(expiresAt),
+      expiresAt: normalizedExpiresAt,
+      expiresAtEpoch: normalizeExpiryEpoch(
+        typeof expiresAt === 'number' ? expiresAt : null,
+        normalizedExpiresAt,
+      ),
       obtainedAt: utcNowIso(),
       extra: extra === undefined ? null : extra,
     };
 
     this._upsertCredsToken(provider, token);
+    this.invalidateAccessToken(provider);
   }
 
   startSyncRun(provider, resource, watermarkBefore = null) {
@@ -818,6 +954,10 @@ export class HealthSyncDb {
 
       const entry = { provider, resource, stats };
       this._runStatsStack.push(entry);
+      // The running-row check above keeps other writers off this resource, so
+      // the provider's own reads can reuse this row until it writes a new state.
+      const stateKey = this._syncRunKey(provider, resource);
+      this._syncStateCache.set(stateKey, stateBefore);
       let status = 'success';
       let errorText = null;
       try {
@@ -828,6 +968,7 @@ export class HealthSyncDb {
         throw err;
       } finally {
         this._runStatsStack.pop();
+        this._syncStateCache.delete(stateKey);
         const stateAfter = this.getSyncState(provider, resource);
         this.finishSyncRun(runId, {
           status,
@@ -899,16 +1040,11 @@ export class HealthSyncDb {
   }
 
   getSyncWatermarkEpoch(provider, resource) {
-    const state = this.getSyncState(provider, resource);
-    if (!state?.watermark) {
-      return null;
-    }
-    return toEpochSeconds(state.watermark);
+    return this.getSyncState(provider, resource)?.watermarkEpoch ?? null;
   }
 
   setSyncWatermarkEpoch(provider, resource, epochSeconds, extra = null) {
-    const normalized = dtToIsoZ(new Date(Number(epochSeconds) * 1000));
-    this.setSyncState(provider, resource, { watermark: normalized, extra });
+    this.setSyncState(provider, resource, { watermark: Number(epochSeconds), extra });
   }
 
   async transaction(fn) {
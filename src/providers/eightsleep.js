@@ -5,6 +5,8 @@ import {
   utcNowIso,
 } from '../util.js';
 
+const TOKEN_EXTRA_EXCLUDED_KEYS = new Set(['access_token', 'expires_in']);
+
 function dateToYYYYMMDD(date) {
   const y = date.getUTCFullYear();
   const m = String(date.getUTCMonth() + 1).padStart(2, '0');
@@ -34,7 +36,7 @@ function tokenExpiredSoon(expiresAtIso, skewSeconds = 60) {
 function tokenExtra(payload) {
   const out = {};
   for (const [key, value] of Object.entries(payload || {})) {
-    if (key === 'access_token' || key === 'expires_in') {
+    if (TOKEN_EXTRA_EXCLUDED_KEYS.has(key)) {
       continue;
     }
     out[key] = value;
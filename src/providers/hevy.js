@@ -1,5 +1,5 @@
 import {
-  dtToIsoZ,
+  epochToIsoZ,
   requestJson,
   sha256Hex,
   toEpochSeconds,
@@ -18,7 +18,7 @@ function isoFromEpochSeconds(epochSeconds) {
   if (!Number.isFinite(value)) {
     return null;
   }
-  return dtToIsoZ(new Date(Math.floor(value) * 1000));
+  return epochToIsoZ(value);
 }
 
 function hevyHeaders(apiKey) {
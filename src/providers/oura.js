@@ -2,10 +2,15 @@ import crypto from 'node:crypto';
 import {
   basicAuthHeader,
   dtToIsoZ,
+  mapConcurrentOrdered,
   oauthListenForCode,
+  oauthStateMismatch,
   openInBrowser,
+  parseRedirectUri,
   requestJson,
   sha256Hex,
+  stableJsonStringify,
+  toEpochSeconds,
   utcNowIso,
 } from '../util.js';
 
@@ -13,6 +18,9 @@ const OURA_BASE = 'https://api.ouraring.com';
 const OURA_DEFAULT_AUTHORIZE = 'https://moi.ouraring.com/oauth/v2/ext/oauth-authorize';
 const OURA_DEFAULT_TOKEN = 'https://moi.ouraring.com/oauth/v2/ext/oauth-token';
 
+const HEARTRATE_WINDOW_CONCURRENCY = 4;
+const TOKEN_EXTRA_EXCLUDED_KEYS = new Set(['access_token', 'refresh_token', 'token_type', 'scope', 'expires_in']);
+
 const DATE_WINDOW_RESOURCES = {
   daily_activity: '/v2/usercollection/daily_activity',
   daily_sleep: '/v2/usercollection/daily_sleep',
@@ -25,16 +33,6 @@ function randomState() {
   return crypto.randomBytes(16).toString('hex');
 }
 
-function parseRedirectConfig(redirectUri) {
-  const parsed = new URL(redirectUri);
-  return {
-    host: parsed.hostname,
-    port: parsed.port ? Number.parseInt(parsed.port, 10) : (parsed.protocol === 'https:' ? 443 : 80),
-    path: parsed.pathname || '/callback',
-    uri: parsed.toString(),
-  };
-}
-
 function ymdUtc(date) {
   const y = date.getUTCFullYear();
   const m = String(date.getUTCMonth() + 1).padStart(2, '0');
@@ -48,21 +46,18 @@ function addDays(date, days) {
   return copy;
 }
 
-function tokenExpiredSoon(expiresAtIso, skewSeconds = 60) {
-  if (!expiresAtIso) {
-    return true;
-  }
-  const expiryMs = Date.parse(expiresAtIso);
-  if (Number.isNaN(expiryMs)) {
+function tokenExpiredSoon(token, skewSeconds = 60) {
+  const expiresAtEpoch = token.expiresAtEpoch ?? toEpochSeconds(token.expiresAt);
+  if (expiresAtEpoch === null || expiresAtEpoch === undefined) {
     return true;
   }
-  return expiryMs <= (Date.now() + skewSeconds * 1000);
+  return expiresAtEpoch <= (Date.now() / 1000) + skewSeconds;
 }
 
 function tokenExtra(raw, endpoint, issuer = null, discoveryUrl = null) {
   const extra = {};
   for (const [key, value] of Object.entries(raw || {})) {
-    if (['access_token', 'refresh_token', 'token_type', 'scope', 'expires_in'].includes(key)) {
+    if (TOKEN_EXTRA_EXCLUDED_KEYS.has(key)) {
       continue;
     }
     extra[key] = value;
@@ -159,60 +154,93 @@ function chooseArray(payload) {
   return [];
 }
 
-function dateWindowRecordId(item) {
-  return String(item?.id || item?.day || item?.timestamp || sha256Hex(JSON.stringify(item)));
-}
-
-function dateWindowStart(item) {
-  return item?.day || item?.start_datetime || item?.timestamp || item?.start_time || null;
+function dateWindowRow(resource, item) {
+  const payloadJson = stableJsonStringify(item);
+  return {
+    provider: 'oura',
+    resource,
+    recordId: String(item?.id || item?.day || item?.timestamp || sha256Hex(JSON.stringify(item))),
+    startTime: item?.day || item?.start_datetime || item?.timestamp || item?.start_time || null,
+    endTime: item?.end_datetime || item?.end_time || null,
+    sourceUpdatedAt: item?.updated_at || item?.modified_at || item?.timestamp || null,
+    payload: item,
+    payloadJson,
+  };
 }
 
-function dateWindowEnd(item) {
-  return item?.end_datetime || item?.end_time || null;
+function heartrateRow(item) {
+  const ts = item?.timestamp || item?.time || item?.datetime || null;
+  const payloadJson = stableJsonStringify(item);
+  return {
+    provider: 'oura',
+    resource: 'heartrate',
+    recordId: String(item?.id || ts || sha256Hex(JSON.stringify(item))),
+    startTime: ts,
+    endTime: null,
+    sourceUpdatedAt: ts,
+    payload: item,
+    payloadJson,
+  };
 }
 
-function dateWindowUpdated(item) {
-  return item?.updated_at || item?.modified_at || item?.timestamp || null;
+function ouraHeaders(accessToken) {
+  return {
+    Authorization: `Bearer ${accessToken}`,
+  };
 }
 
-function heartrateRecordId(item) {
-  return String(item?.id || item?.timestamp || item?.time || item?.datetime || sha256Hex(JSON.stringify(item)));
-}
+async function* ouraFetchPages(pathname, headers, params, signal = null) {
+  const baseUrl = new URL(`${OURA_BASE}${pathname}`);
+  for (const [key, value] of Object.entries(params || {})) {
+    if (value !== undefined && value !== null) {
+      baseUrl.searchParams.set(key, String(value));
+    }
+  }
+  const baseHref = baseUrl.toString();
+  const separator = baseUrl.search ? '&' : '?';
+  const fetchPage = (nextToken) => {
+    const url = nextToken
+      ? `${baseHref}${separator}${new URLSearchParams({ next_token: nextToken })}`
+      : baseHref;
+    const promise = requestJson(url, { headers, signal });
+    // Rejections are surfaced when the prefetched page is awaited below.
+    promise.catch(() => {});
+    return promise;
+  };
 
-function heartrateTimestamp(item) {
-  return item?.timestamp || item?.time || item?.datetime || null;
+  let pending = fetchPage(null);
+  while (pending) {
+    const payload = await pending;
+    const nextToken = payload?.next_token || null;
+    // Request the next page before handing this one to the caller so the
+    // network round-trip overlaps with the caller's database writes.
+    pending = nextToken ? fetchPage(nextToken) : null;
+    yield chooseArray(payload);
+  }
 }
 
-async function ouraFetchAll(pathname, accessToken, params) {
+async function ouraFetchAll(pathname, headers, params, signal = null) {
   const out = [];
-  let nextToken = null;
-
-  do {
-    const requestParams = { ...params };
-    if (nextToken) {
-      requestParams.next_token = nextToken;
+  for await (const page of ouraFetchPages(pathname, headers, params, signal)) {
+    for (const item of page) {
+      out.push(item);
     }
-
-    const payload = await requestJson(`${OURA_BASE}${pathname}`, {
-      headers: {
-        Authorization: `Bearer ${accessToken}`,
-      },
-      params: requestParams,
-    });
-
-    out.push(...chooseArray(payload));
-    nextToken = payload?.next_token || null;
-  } while (nextToken);
-
+  }
   return out;
 }
 
-async function ouraRefreshIfNeeded(db, cfg) {
+async function ouraRefreshIfNeeded(db, cfg, { force = false } = {}) {
+  const cached = force ? null : db.cachedAccessToken('oura');
+  if (cached) {
+    return cached;
+  }
+
   const token = db.getOAuthToken('oura');
   if (!token) {
     throw new Error('Oura token not found. Run `health-sync auth oura`.');
   }
-  if (!tokenExpiredSoon(token.expiresAt)) {
+  if (!force && !tokenExpiredSoon(token)) {
+    db.cacheAccessToken('oura', token.accessToken, token.expiresAtEpoch);
     return token.accessToken;
   }
 
@@ -248,7 +276,7 @@ async function ouraRefreshIfNeeded(db, cfg) {
   }
 
   const expiresIn = Number.parseInt(String(refreshed.expires_in ?? 0), 10) || 0;
-  const expiresAt = expiresIn > 0 ? dtToIsoZ(new Date(Date.now() + expiresIn * 1000)) : null;
+  const expiresAtEpoch = expiresIn > 0 ? Math.floor(Date.now() / 1000) + expiresIn : null;
 
   const newExtra = tokenExtra(refreshed, resolved.tokenEndpoint, resolved.issuer, resolved.discoveryUrl);
   db.setOAuthToken('oura', {
@@ -256,9 +284,10 @@ async function ouraRefreshIfNeeded(db, cfg) {
     refreshToken: refreshed.refresh_token || token.refreshToken,
     tokenType: refreshed.token_type || token.tokenType || 'Bearer',
     scope: refreshed.scope || token.scope,
-    expiresAt,
+    expiresAt: expiresAtEpoch,
     extra: mergeTokenExtra(token.extra, newExtra),
   });
+  db.cacheAccessToken('oura', refreshed.access_token, expiresAtEpoch);
 
   return String(refreshed.access_token);
 }
@@ -269,7 +298,7 @@ async function ouraAuth(db, config, helpers, options = {}) {
   const clientSecret = helpers.requireStr('oura', 'client_secret', 'Missing [oura].client_secret');
   const redirectUri = helpers.requireStr('oura', 'redirect_uri', 'Missing [oura].redirect_uri');
 
-  const redirect = parseRedirectConfig(redirectUri);
+  const redirect = parseRedirectUri(redirectUri);
   const listenHost = options.listenHost || redirect.host || '127.0.0.1';
   const listenPort = Number.isFinite(options.listenPort) && Number(options.listenPort) > 0
     ? Number(options.listenPort)
@@ -302,7 +331,7 @@ async function ouraAuth(db, config, helpers, options = {}) {
   if (!callback.code) {
     throw new Error('Oura OAuth did not return an authorization code');
   }
-  if (callback.state && callback.state !== state) {
+  if (oauthStateMismatch(callback.state, state)) {
     throw new Error('Oura OAuth state mismatch');
   }
 
@@ -323,14 +352,14 @@ async function ouraAuth(db, config, helpers, options = {}) {
   }
 
   const expiresIn = Number.parseInt(String(tokenPayload.expires_in ?? 0), 10) || 0;
-  const expiresAt = expiresIn > 0 ? dtToIsoZ(new Date(Date.now() + expiresIn * 1000)) : null;
+  const expiresAtEpoch = expiresIn > 0 ? Math.floor(Date.now() / 1000) + expiresIn : null;
 
   db.setOAuthToken('oura', {
     accessToken: String(tokenPayload.access_token),
     refreshToken: tokenPayload.refresh_token || null,
     tokenType: tokenPayload.token_type || 'Bearer',
     scope: tokenPayload.scope || cfg.scopes,
-    expiresAt,
+    expiresAt: expiresAtEpoch,
     extra: tokenExtra(tokenPayload, resolved.tokenEndpoint, resolved.issuer, resolved.discoveryUrl),
   });
 
@@ -339,36 +368,19 @@ async function ouraAuth(db, config, helpers, options = {}) {
 
 function startDateForResource(db, cfg, resource) {
   const overlapDays = Math.max(0, Number.parseInt(String(cfg.overlap_days ?? 7), 10) || 7);
-  const state = db.getSyncState('oura', resource);
-  if (!state?.watermark) {
-    return String(cfg.start_date || '2010-01-01');
-  }
-
-  const wmDate = new Date(state.watermark);
-  if (Number.isNaN(wmDate.getTime())) {
+  const watermarkEpoch = db.getSyncWatermarkEpoch('oura', resource);
+  if (watermarkEpoch === null) {
     return String(cfg.start_date || '2010-01-01');
   }
 
-  const dateOnly = new Date(Date.UTC(
-    wmDate.getUTCFullYear(),
-    wmDate.getUTCMonth(),
-    wmDate.getUTCDate(),
-    0,
-    0,
-    0,
-  ));
-  dateOnly.setUTCDate(dateOnly.getUTCDate() - overlapDays);
-  return ymdUtc(dateOnly);
+  const dayStartEpoch = Math.floor(watermarkEpoch / 86400) * 86400;
+  return ymdUtc(new Date((dayStartEpoch - overlapDays * 86400) * 1000));
 }
 
-async function syncPersonalInfo(db, token) {
+async function syncPersonalInfo(db, headers) {
   await db.syncRun('oura', 'personal_info', async () => {
     await db.transaction(async () => {
-      const payload = await requestJson(`${OURA_BASE}/v2/usercollection/personal_info`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      });
+      const payload = await requestJson(`${OURA_BASE}/v2/usercollection/personal_info`, { headers });
       db.upsertRecord({
         provider: 'oura',
         resource: 'personal_info',
@@ -386,7 +398,7 @@ async function syncPersonalInfo(db, token) {
   });
 }
 
-async function syncDateWindowResource(db, token, cfg, resource, endpoint) {
+async function syncDateWindowResource(db, headers, cfg, resource, endpoint) {
   await db.syncRun('oura', resource, async () => {
     await db.transaction(async () => {
       const startDate = startDateForResource(db, cfg, resource);
@@ -394,22 +406,17 @@ async function syncDateWindowResource(db, token, cfg, resource, endpoint) {
       if (resource === 'sleep') {
         endDate = ymdUtc(addDays(new Date(), 1));
       }
+      if (startDate > endDate) {
+        console.log(`Skipping oura/${resource}: start_date ${startDate} is after end_date ${endDate}.`);
+        return;
+      }
 
-      const entries = await ouraFetchAll(endpoint, token, {
+      const pages = ouraFetchPages(endpoint, headers, {
         start_date: startDate,
         end_date: endDate,
       });
-
-      for (const item of entries) {
-        db.upsertRecord({
-          provider: 'oura',
-          resource,
-          recordId: dateWindowRecordId(item),
-          startTime: dateWindowStart(item),
-          endTime: dateWindowEnd(item),
-          sourceUpdatedAt: dateWindowUpdated(item),
-          payload: item,
-        });
+      for await (const page of pages) {
+        db.upsertRecords(page.map((item) => dateWindowRow(resource, item)));
       }
 
       db.setSyncState('oura', resource, {
@@ -419,7 +426,21 @@ async function syncDateWindowResource(db, token, cfg, resource, endpoint) {
   });
 }
 
-async function syncHeartrate(db, token, cfg) {
+function heartrateWindows(start, end, chunkDays) {
+  const windows = [];
+  let cursor = start;
+  while (cursor < end) {
+    const chunkEnd = addDays(cursor, chunkDays);
+    if (chunkEnd > end) {
+      chunkEnd.setTime(end.getTime());
+    }
+    windows.push({ start: cursor, end: chunkEnd });
+    cursor = new Date(chunkEnd.getTime() + 1000);
+  }
+  return windows;
+}
+
+async function syncHeartrate(db, headers, cfg) {
   await db.syncRun('oura', 'heartrate', async () => {
     await db.transaction(async () => {
       const now = new Date();
@@ -432,33 +453,28 @@ async function syncHeartrate(db, token, cfg) {
       }
       cursor = addDays(cursor, -1);
 
-      while (cursor < now) {
-        const chunkEnd = new Date(cursor.getTime());
-        chunkEnd.setUTCDate(chunkEnd.getUTCDate() + chunkDays);
-        if (chunkEnd > now) {
-          chunkEnd.setTime(now.getTime());
-        }
-
-        const entries = await ouraFetchAll('/v2/usercollection/heartrate', token, {
-          start_datetime: dtToIsoZ(cursor),
-          end_datetime: dtToIsoZ(chunkEnd),
-        });
-
-        for (const item of entries) {
-          const ts = heartrateTimestamp(item);
-          db.upsertRecord({
-            provider: 'oura',
-            resource: 'heartrate',
-            recordId: heartrateRecordId(item),
-            startTime: ts,
-            endTime: null,
-            sourceUpdatedAt: ts,
-            payload: item,
-          });
+      const windows = heartrateWindows(cursor, now, chunkDays);
+      const aborter = new AbortController();
+      const fetches = mapConcurrentOrdered(windows, HEARTRATE_WINDOW_CONCURRENCY, (window) => ouraFetchAll(
+        '/v2/usercollection/heartrate',
+        headers,
+        {
+          start_datetime: dtToIsoZ(window.start),
+          end_datetime: dtToIsoZ(window.end),
+        },
+        aborter.signal,
+      ).catch((err) => {
+        // One failed window fails the sync; stop the others paginating.
+        aborter.abort();
+        throw err;
+      }));
+
+      try {
+        for await (const entries of fetches) {
+          db.upsertRecords(entries.map(heartrateRow));
         }
-
-        cursor = addDays(chunkEnd, 0);
-        cursor.setUTCSeconds(cursor.getUTCSeconds() + 1);
+      } finally {
+        aborter.abort();
       }
 
       db.setSyncState('oura', 'heartrate', {
@@ -470,13 +486,22 @@ async function syncHeartrate(db, token, cfg) {
 
 async function ouraSync(db, config, helpers) {
   const cfg = helpers.configFor('oura');
-  const token = await ouraRefreshIfNeeded(db, cfg);
+  let headers = ouraHeaders(await ouraRefreshIfNeeded(db, cfg));
 
-  await syncPersonalInfo(db, token);
+  try {
+    await syncPersonalInfo(db, headers);
+  } catch (err) {
+    if (err?.status !== 401 || !cfg.client_id || !cfg.client_secret) {
+      throw err;
+    }
+    db.invalidateAccessToken('oura');
+    headers = ouraHeaders(await ouraRefreshIfNeeded(db, cfg, { force: true }));
+    await syncPersonalInfo(db, headers);
+  }
   for (const [resource, endpoint] of Object.entries(DATE_WINDOW_RESOURCES)) {
-    await syncDateWindowResource(db, token, cfg, resource, endpoint);
+    await syncDateWindowResource(db, headers, cfg, resource, endpoint);
   }
-  await syncHeartrate(db, token, cfg);
+  await syncHeartrate(db, headers, cfg);
 }
 
 const ouraProvider = {
@@ -1,10 +1,13 @@
 import crypto from 'node:crypto';
 import {
-  dtToIsoZ,
   oauthListenForCode,
+  oauthStateMismatch,
   openInBrowser,
+  parseRedirectUri,
   requestJson,
   sha256Hex,
+  splitScopes,
+  stableJsonStringify,
   toEpochSeconds,
   utcNowIso,
 } from '../util.js';
@@ -12,33 +15,27 @@ import {
 const STRAVA_AUTH_URL = 'https://www.strava.com/oauth/authorize';
 const STRAVA_TOKEN_URL = 'https://www.strava.com/oauth/token';
 const STRAVA_API_BASE = 'https://www.strava.com/api/v3';
+const STRAVA_DEFAULT_SCOPES = 'read,activity:read_all';
+const STRAVA_PAGE_PREFETCH = 2;
 
 function randomState() {
   return crypto.randomBytes(16).toString('hex');
 }
 
-function parseRedirectConfig(redirectUri) {
-  const parsed = new URL(redirectUri);
-  return {
-    host: parsed.hostname,
-    port: parsed.port ? Number.parseInt(parsed.port, 10) : (parsed.protocol === 'https:' ? 443 : 80),
-    path: parsed.pathname || '/callback',
-    uri: parsed.toString(),
-  };
+function stravaScopes(rawScopes) {
+  const parts = splitScopes(rawScopes);
+  return [...new Set(parts)].join(',') || STRAVA_DEFAULT_SCOPES;
 }
 
-function tokenExpiredSoon(expiresAtIso, skewSeconds = 60) {
-  if (!expiresAtIso) {
-    return true;
-  }
-  const expiryMs = Date.parse(expiresAtIso);
-  if (Number.isNaN(expiryMs)) {
+function tokenExpiredSoon(token, skewSeconds = 60) {
+  const expiresAtEpoch = token.expiresAtEpoch ?? toEpochSeconds(token.expiresAt);
+  if (expiresAtEpoch === null || expiresAtEpoch === undefined) {
     return true;
   }
-  return expiryMs <= (Date.now() + skewSeconds * 1000);
+  return expiresAtEpoch <= (Date.now() / 1000) + skewSeconds;
 }
 
-async function refreshTokenIfNeeded(db, cfgSection) {
+async function refreshTokenIfNeeded(db, cfgSection, { force = false } = {}) {
   if (cfgSection.access_token) {
     db.setOAuthToken('strava', {
       accessToken: String(cfgSection.access_token),
@@ -51,14 +48,21 @@ async function refreshTokenIfNeeded(db, cfgSection) {
     return String(cfgSection.access_token);
   }
 
+  const cached = force ? null : db.cachedAccessToken('strava');
+  if (cached) {
+    return cached;
+  }
+
   const token = db.getOAuthToken('strava');
   if (!token) {
     throw new Error('Strava token not found. Run `health-sync auth strava` or set [strava].access_token.');
   }
   if (!token.refreshToken || !token.expiresAt) {
+    db.cacheAccessToken('strava', token.accessToken);
     return token.accessToken;
   }
-  if (!tokenExpiredSoon(token.expiresAt)) {
+  if (!force && !tokenExpiredSoon(token)) {
+    db.cacheAccessToken('strava', token.accessToken, token.expiresAtEpoch);
     return token.accessToken;
   }
 
@@ -76,21 +80,20 @@ async function refreshTokenIfNeeded(db, cfgSection) {
     },
   });
 
-  const expiresAt = refreshed.expires_at
-    ? dtToIsoZ(new Date(Number(refreshed.expires_at) * 1000))
-    : null;
+  const expiresAtEpoch = refreshed.expires_at ? toEpochSeconds(refreshed.expires_at) : null;
 
   db.setOAuthToken('strava', {
     accessToken: String(refreshed.access_token),
     refreshToken: refreshed.refresh_token || token.refreshToken,
     tokenType: refreshed.token_type || 'Bearer',
     scope: refreshed.scope || token.scope,
-    expiresAt,
+    expiresAt: expiresAtEpoch,
     extra: {
       athlete: refreshed.athlete || null,
       method: 'oauth',
     },
   });
+  db.cacheAccessToken('strava', refreshed.access_token, expiresAtEpoch);
 
   return String(refreshed.access_token);
 }
@@ -113,10 +116,10 @@ async function stravaAuth(db, config, helpers, options = {}) {
   const clientId = helpers.requireStr('strava', 'client_id', 'Missing [strava].client_id');
   const clientSecret = helpers.requireStr('strava', 'client_secret', 'Missing [strava].client_secret');
   const redirectUri = helpers.requireStr('strava', 'redirect_uri', 'Missing [strava].redirect_uri');
-  const scopes = String(cfg.scopes || 'read,activity:read_all');
+  const scopes = stravaScopes(cfg.scopes);
   const approvalPrompt = String(cfg.approval_prompt || 'auto');
 
-  const redirect = parseRedirectConfig(redirectUri);
+  const redirect = parseRedirectUri(redirectUri);
   const listenHost = options.listenHost || redirect.host || '127.0.0.1';
   const listenPort = Number.isFinite(options.listenPort) && Number(options.listenPort) > 0
     ? Number(options.listenPort)
@@ -149,7 +152,7 @@ async function stravaAuth(db, config, helpers, options = {}) {
   if (!callback.code) {
     throw new Error('Strava OAuth did not return an authorization code');
   }
-  if (callback.state && callback.state !== state) {
+  if (oauthStateMismatch(callback.state, state)) {
     throw new Error('Strava OAuth state mismatch');
   }
 
@@ -163,16 +166,14 @@ async function stravaAuth(db, config, helpers, options = {}) {
     },
   });
 
-  const expiresAt = token.expires_at
-    ? dtToIsoZ(new Date(Number(token.expires_at) * 1000))
-    : null;
+  const expiresAtEpoch = token.expires_at ? toEpochSeconds(token.expires_at) : null;
 
   db.setOAuthToken('strava', {
     accessToken: String(token.access_token),
     refreshToken: token.refresh_token || null,
     tokenType: token.token_type || 'Bearer',
     scope: token.scope || scopes,
-    expiresAt,
+    expiresAt: expiresAtEpoch,
     extra: {
       athlete: token.athlete || null,
       method: 'oauth',
@@ -182,13 +183,17 @@ async function stravaAuth(db, config, helpers, options = {}) {
   console.log('Strava authorization succeeded.');
 }
 
+function stravaHeaders(token) {
+  return {
+    Authorization: `Bearer ${token}`,
+  };
+}
+
 async function syncAthlete(db, token) {
   await db.syncRun('strava', 'athlete', async () => {
     await db.transaction(async () => {
       const payload = await requestJson(`${STRAVA_API_BASE}/athlete`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
+        headers: stravaHeaders(token),
       });
 
       const recordId = payload?.id ? String(payload.id) : 'me';
@@ -205,86 +210,130 @@ async function syncAthlete(db, token) {
   });
 }
 
+function activityRow(item) {
+  const startTime = item?.start_date || null;
+  const payloadJson = stableJsonStringify(item);
+  return {
+    provider: 'strava',
+    resource: 'activities',
+    recordId: item?.id ? String(item.id) : sha256Hex(JSON.stringify(item)),
+    startTime,
+    endTime: null,
+    sourceUpdatedAt: item?.updated_at || startTime,
+    payload: item,
+    payloadJson,
+  };
+}
+
 async function syncActivities(db, token, cfg) {
   await db.syncRun('strava', 'activities', async () => {
-    await db.transaction(async () => {
-      const pageSize = Math.max(1, Math.min(200, Number.parseInt(String(cfg.page_size ?? 100), 10) || 100));
-      const syncStartedAt = utcNowIso();
-      const state = db.getSyncState('strava', 'activities');
-      const existingWatermarkEpoch = state?.watermark ? toEpochSeconds(state.watermark) : null;
-      const startDateEpoch = toEpochSeconds(cfg.start_date || '2010-01-01') || 0;
-      const beforeEpoch = toEpochSeconds(syncStartedAt) || Math.floor(Date.now() / 1000);
-
-      let page = 1;
-      let maxStartEpoch = existingWatermarkEpoch === null ? startDateEpoch : existingWatermarkEpoch;
-      const seenRecordIds = new Set();
-
-      while (true) {
-        const batch = await requestJson(`${STRAVA_API_BASE}/athlete/activities`, {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
-          params: {
-            after: startDateEpoch,
-            before: beforeEpoch,
-            page,
-            per_page: pageSize,
-          },
-        });
+    const pageSize = Math.max(1, Math.min(200, Number.parseInt(String(cfg.page_size ?? 100), 10) || 100));
+    const syncStartedAt = utcNowIso();
+    const state = db.getSyncState('strava', 'activities');
+    const existingWatermarkEpoch = state?.watermarkEpoch ?? null;
+    const startDateEpoch = toEpochSeconds(cfg.start_date || '2010-01-01') || 0;
+    const beforeEpoch = toEpochSeconds(syncStartedAt) || Math.floor(Date.now() / 1000);
+    // With `after` set, Strava lists activities oldest first, so the cursor
+    // left by an interrupted pass marks everything before it as stored.
+    const resumeEpoch = Number.parseInt(String(state?.cursor ?? ''), 10);
+    const resumed = Number.isFinite(resumeEpoch) && resumeEpoch > startDateEpoch;
+    const afterEpoch = resumed ? resumeEpoch - 1 : startDateEpoch;
+
+    let maxStartEpoch = existingWatermarkEpoch === null ? startDateEpoch : existingWatermarkEpoch;
+    let checkpointEpoch = resumed ? resumeEpoch : startDateEpoch;
+    const seenRecordIds = new Set();
+    const headers = stravaHeaders(token);
+    const baseUrl = new URL(`${STRAVA_API_BASE}/athlete/activities`);
+    baseUrl.searchParams.set('after', String(afterEpoch));
+    baseUrl.searchParams.set('before', String(beforeEpoch));
+    baseUrl.searchParams.set('per_page', String(pageSize));
+    const baseHref = baseUrl.toString();
+    const aborter = new AbortController();
+    const fetchPage = (page) => {
+      const promise = requestJson(`${baseHref}&page=${page}`, { headers, signal: aborter.signal });
+      // Speculative pages past the end are dropped; their errors must not go unhandled.
+      promise.catch(() => {});
+      return promise;
+    };
+
+    let lastRequestedPage = 1;
+    const inflight = [fetchPage(lastRequestedPage)];
+    try {
+      while (inflight.length) {
+        const batch = await inflight.shift();
 
         const activities = Array.isArray(batch) ? batch : [];
-        for (const item of activities) {
-          const recordId = item?.id ? String(item.id) : sha256Hex(JSON.stringify(item));
-          seenRecordIds.add(recordId);
-          const startTime = item?.start_date || null;
-          const startEpoch = toEpochSeconds(startTime);
-          if (startEpoch !== null) {
-            maxStartEpoch = Math.max(maxStartEpoch ?? startEpoch, startEpoch);
+        const rows = activities.map(activityRow);
+        for (const row of rows) {
+          seenRecordIds.add(row.recordId);
+          const startEpoch = toEpochSeconds(row.startTime);
+          if (startEpoch !== null && startEpoch > maxStartEpoch) {
+            maxStartEpoch = startEpoch;
+          }
+          if (startEpoch !== null && startEpoch > checkpointEpoch) {
+            checkpointEpoch = startEpoch;
           }
-          db.upsertRecord({
-            provider: 'strava',
-            resource: 'activities',
-            recordId,
-            startTime,
-            endTime: null,
-            sourceUpdatedAt: item?.updated_at || startTime,
-            payload: item,
-          });
         }
+        // Commit each page with a resume cursor so an interrupted backfill
+        // restarts after it; the watermark only moves once the pass completes.
+        await db.transaction(async () => {
+          db.upsertRecords(rows);
+          db.setSyncState('strava', 'activities', {
+            watermark: existingWatermarkEpoch,
+            cursor: String(checkpointEpoch),
+          });
+        });
 
         if (activities.length < pageSize) {
           break;
         }
-        page += 1;
-      }
-
-      const existingRows = db.conn.prepare(`
-        SELECT record_id
-        FROM records
-        WHERE provider = 'strava' AND resource = 'activities'
-      `).all();
-      for (const row of existingRows) {
-        if (!seenRecordIds.has(row.record_id)) {
-          db.deleteRecord('strava', 'activities', row.record_id, {
-            provider: 'strava',
-            resource: 'activities',
-          });
+        // Only a full page suggests more remain; keep a small window ahead of it.
+        while (inflight.length < STRAVA_PAGE_PREFETCH) {
+          lastRequestedPage += 1;
+          inflight.push(fetchPage(lastRequestedPage));
         }
       }
+    } finally {
+      // Pages requested past the end, or after a failure, are no longer needed.
+      aborter.abort();
+    }
 
-      if (maxStartEpoch !== null) {
-        db.setSyncState('strava', 'activities', {
-          watermark: dtToIsoZ(new Date(maxStartEpoch * 1000)),
-        });
+    await db.transaction(async () => {
+      // A resumed pass never saw the activities before its cursor, so stale
+      // rows are only pruned after a pass that covered the whole history.
+      if (!resumed) {
+        const existingRows = db.conn.prepare(`
+          SELECT record_id
+          FROM records
+          WHERE provider = 'strava' AND resource = 'activities'
+        `).all();
+        for (const row of existingRows) {
+          if (!seenRecordIds.has(row.record_id)) {
+            db.deleteRecord('strava', 'activities', row.record_id, {
+              provider: 'strava',
+              resource: 'activities',
+            });
+          }
+        }
       }
+      db.setSyncState('strava', 'activities', { watermark: maxStartEpoch });
     });
   });
 }
 
 async function stravaSync(db, config, helpers) {
   const cfg = helpers.configFor('strava');
-  const token = await refreshTokenIfNeeded(db, cfg);
-  await syncAthlete(db, token);
+  let token = await refreshTokenIfNeeded(db, cfg);
+  try {
+    await syncAthlete(db, token);
+  } catch (err) {
+    if (err?.status !== 401 || cfg.access_token || !cfg.client_id || !cfg.client_secret) {
+      throw err;
+    }
+    db.invalidateAccessToken('strava');
+    token = await refreshTokenIfNeeded(db, cfg, { force: true });
+    await syncAthlete(db, token);
+  }
   await syncActivities(db, token, cfg);
 }
 
@@ -1,10 +1,14 @@
 import crypto from 'node:crypto';
 import {
   dtToIsoZ,
+  epochToIsoZ,
   oauthListenForCode,
+  oauthStateMismatch,
   openInBrowser,
+  parseRedirectUri,
   requestJson,
   sha256Hex,
+  splitScopes,
   toEpochSeconds,
   utcNowIso,
 } from '../util.js';
@@ -23,6 +27,7 @@ const WHOOP_DEFAULT_SCOPES = [
   'read:body_measurement',
 ];
 
+
 const COLLECTION_ENDPOINTS = {
   cycles: '/v2/cycle',
   recoveries: '/v2/recovery',
@@ -34,16 +39,6 @@ function randomState() {
   return crypto.randomBytes(16).toString('hex');
 }
 
-function parseRedirectConfig(redirectUri) {
-  const parsed = new URL(redirectUri);
-  return {
-    host: parsed.hostname,
-    port: parsed.port ? Number.parseInt(parsed.port, 10) : (parsed.protocol === 'https:' ? 443 : 80),
-    path: parsed.pathname || '/callback',
-    uri: parsed.toString(),
-  };
-}
-
 function tokenExpiredSoon(expiresAtIso, skewSeconds = 60) {
   if (!expiresAtIso) {
     return true;
@@ -56,22 +51,8 @@ function tokenExpiredSoon(expiresAtIso, skewSeconds = 60) {
 }
 
 function whoopScopes(rawScopes) {
-  const parts = String(rawScopes || '')
-    .split(/[\s,]+/)
-    .map((scope) => scope.trim())
-    .filter(Boolean);
-  const source = parts.length ? parts : WHOOP_DEFAULT_SCOPES;
-
-  const seen = new Set();
-  const out = [];
-
-  for (const scope of source) {
-    if (!seen.has(scope)) {
-      seen.add(scope);
-      out.push(scope);
-    }
-  }
-  return out;
+  const parts = splitScopes(rawScopes);
+  return [...new Set(parts.length ? parts : WHOOP_DEFAULT_SCOPES)];
 }
 
 function whoopScopeString(rawScopes) {
@@ -177,7 +158,7 @@ async function whoopAuth(db, config, helpers, options = {}) {
   const clientSecret = helpers.requireStr('whoop', 'client_secret', 'Missing [whoop].client_secret');
   const redirectUri = helpers.requireStr('whoop', 'redirect_uri', 'Missing [whoop].redirect_uri');
 
-  const redirect = parseRedirectConfig(redirectUri);
+  const redirect = parseRedirectUri(redirectUri);
   const listenHost = options.listenHost || redirect.host || '127.0.0.1';
   const listenPort = Number.isFinite(options.listenPort) && Number(options.listenPort) > 0
     ? Number(options.listenPort)
@@ -210,7 +191,7 @@ async function whoopAuth(db, config, helpers, options = {}) {
   if (!callback.code) {
     throw new Error('WHOOP OAuth did not return an authorization code');
   }
-  if (callback.state && callback.state !== state) {
+  if (oauthStateMismatch(callback.state, state)) {
     throw new Error('WHOOP OAuth state mismatch');
   }
 
@@ -406,7 +387,7 @@ async function syncCollectionResource(db, cfg, token, resource, endpoint) {
       }
 
       db.setSyncState('whoop', resource, {
-        watermark: dtToIsoZ(new Date(maxEpoch * 1000)),
+        watermark: epochToIsoZ(maxEpoch),
       });
     });
   });
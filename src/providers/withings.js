@@ -1,11 +1,14 @@
 import crypto from 'node:crypto';
 import {
-  dtToIsoZ,
+  epochToIsoZ,
   hmacSha256Hex,
   oauthListenForCode,
+  oauthStateMismatch,
   openInBrowser,
+  parseRedirectUri,
   requestJson,
   sha256Hex,
+  splitScopes,
   toEpochSeconds,
   utcNowIso,
 } from '../util.js';
@@ -49,27 +52,24 @@ const SLEEP_SUMMARY_FIELDS = [
   'snoring', 'snoringepisodecount', 'breathing_disturbances_intensity',
 ];
 
-function randomState() {
-  return crypto.randomBytes(16).toString('hex');
+const DEFAULT_MEASTYPES_CSV = DEFAULT_MEASTYPES.join(',');
+const ACTIVITY_FIELDS_CSV = ACTIVITY_FIELDS.join(',');
+const WORKOUT_FIELDS_CSV = WORKOUT_FIELDS.join(',');
+const SLEEP_SUMMARY_FIELDS_CSV = SLEEP_SUMMARY_FIELDS.join(',');
+
+function parseIntSafe(value, fallback) {
+  const parsed = typeof value === 'number' ? Math.trunc(value) : Number.parseInt(String(value), 10);
+  return Number.isFinite(parsed) ? parsed : fallback;
 }
 
-function parseRedirectConfig(redirectUri) {
-  const parsed = new URL(redirectUri);
-  return {
-    host: parsed.hostname,
-    port: parsed.port ? Number.parseInt(parsed.port, 10) : (parsed.protocol === 'https:' ? 443 : 80),
-    path: parsed.pathname || '/callback',
-    uri: parsed.toString(),
-  };
+function randomState() {
+  return crypto.randomBytes(16).toString('hex');
 }
 
 function withingsScopes(rawScopes) {
   const seen = new Set();
   const out = [];
-  const parts = String(rawScopes || 'user.metrics,user.activity')
-    .split(/[\s,]+/)
-    .map((s) => s.trim())
-    .filter(Boolean);
+  const parts = splitScopes(rawScopes || 'user.metrics,user.activity');
 
   for (const scope of parts) {
     const normalized = scope === 'user.sleep' ? 'user.activity' : scope;
@@ -82,10 +82,10 @@ function withingsScopes(rawScopes) {
     }
   }
 
-  if (!out.includes('user.metrics')) {
+  if (!seen.has('user.metrics')) {
     out.unshift('user.metrics');
   }
-  if (!out.includes('user.activity')) {
+  if (!seen.has('user.activity')) {
     out.push('user.activity');
   }
   return out;
@@ -108,17 +108,6 @@ function withingsSignatureFor(action, clientId, clientSecret, timestamp = null,
   return hmacSha256Hex(clientSecret, parts.join(','));
 }
 
-function toIsoFromEpoch(epoch) {
-  if (epoch === null || epoch === undefined) {
-    return null;
-  }
-  const n = Number(epoch);
-  if (!Number.isFinite(n)) {
-    return null;
-  }
-  return dtToIsoZ(new Date(Math.floor(n) * 1000));
-}
-
 async function withingsNonce(clientId, clientSecret) {
   const timestamp = Math.floor(Date.now() / 1000);
   const signature = withingsSignatureFor('getnonce', clientId, clientSecret, timestamp, null);
@@ -143,42 +132,48 @@ async function withingsNonce(clientId, clientSecret) {
   return String(nonce);
 }
 
-function tokenExpiredSoon(expiresAtIso, skewSeconds = 60) {
-  if (!expiresAtIso) {
+function tokenExpiredSoon(token, skewSeconds = 60) {
+  const expiresAtEpoch = token.expiresAtEpoch ?? toEpochSeconds(token.expiresAt);
+  if (expiresAtEpoch === null || expiresAtEpoch === undefined) {
     return true;
   }
-  const expiryMs = Date.parse(expiresAtIso);
-  if (Number.isNaN(expiryMs)) {
-    return true;
-  }
-  return expiryMs <= (Date.now() + skewSeconds * 1000);
+  return expiresAtEpoch <= Math.floor(Date.now() / 1000) + skewSeconds;
 }
 
-async function withingsRefreshIfNeeded(db, cfg) {
+async function withingsRefreshIfNeeded(db, cfg, { force = false } = {}) {
+  const cached = force ? null : db.cachedAccessToken('withings');
+  if (cached) {
+    return cached;
+  }
+
   const token = db.getOAuthToken('withings');
   if (!token) {
     throw new Error('Withings token not found. Run `health-sync auth withings`.');
   }
   if (!token.refreshToken || !token.expiresAt) {
+    db.cacheAccessToken('withings', token.accessToken);
     return token.accessToken;
   }
-  if (!tokenExpiredSoon(token.expiresAt)) {
+  if (!force && !tokenExpiredSoon(token)) {
+    db.cacheAccessToken('withings', token.accessToken, token.expiresAtEpoch);
     return token.accessToken;
   }
 
-  if (!cfg.client_id || !cfg.client_secret) {
+  const clientId = cfg.client_id ? String(cfg.client_id) : '';
+  const clientSecret = cfg.client_secret ? String(cfg.client_secret) : '';
+  if (!clientId || !clientSecret) {
     throw new Error('Withings credentials are missing. Run `health-sync auth withings` after setting client_id/client_secret.');
   }
 
-  const nonce = await withingsNonce(cfg.client_id, cfg.client_secret);
-  const signature = withingsSignatureFor('requesttoken', cfg.client_id, cfg.client_secret, null, nonce);
+  const nonce = await withingsNonce(clientId, clientSecret);
+  const signature = withingsSignatureFor('requesttoken', clientId, clientSecret, null, nonce);
 
   const j = await requestJson(WITHINGS_TOKEN, {
     method: 'POST',
     data: {
       action: 'requesttoken',
       grant_type: 'refresh_token',
-      client_id: cfg.client_id,
+      client_id: clientId,
       refresh_token: token.refreshToken,
       nonce,
       signature,
@@ -190,19 +185,20 @@ async function withingsRefreshIfNeeded(db, cfg) {
   }
 
   const body = j.body;
-  const expiresIn = Number.parseInt(String(body.expires_in ?? 0), 10) || 0;
-  const expiresAt = expiresIn > 0 ? dtToIsoZ(new Date(Date.now() + expiresIn * 1000)) : null;
+  const expiresIn = parseIntSafe(body.expires_in, 0);
+  const expiresAtEpoch = expiresIn > 0 ? Math.floor(Date.now() / 1000) + expiresIn : null;
 
   db.setOAuthToken('withings', {
     accessToken: String(body.access_token),
     refreshToken: body.refresh_token || token.refreshToken,
     tokenType: body.token_type || token.tokenType || 'Bearer',
     scope: body.scope || token.scope,
-    expiresAt,
+    expiresAt: expiresAtEpoch,
     extra: {
       method: 'oauth',
     },
   });
+  db.cacheAccessToken('withings', body.access_token, expiresAtEpoch);
 
   return String(body.access_token);
 }
@@ -214,7 +210,7 @@ async function withingsAuth(db, config, helpers, options = {}) {
   const redirectUri = helpers.requireStr('withings', 'redirect_uri', 'Missing [withings].redirect_uri');
 
   const scopes = withingsScopes(cfg.scopes);
-  const redirect = parseRedirectConfig(redirectUri);
+  const redirect = parseRedirectUri(redirectUri);
 
   const listenHost = options.listenHost || redirect.host || '127.0.0.1';
   const listenPort = Number.isFinite(options.listenPort) && Number(options.listenPort) > 0
@@ -248,7 +244,7 @@ async function withingsAuth(db, config, helpers, options = {}) {
   if (!callback.code) {
     throw new Error('Withings OAuth did not return an authorization code');
   }
-  if (callback.state && callback.state !== state) {
+  if (oauthStateMismatch(callback.state, state)) {
     throw new Error('Withings OAuth state mismatch');
   }
 
@@ -273,15 +269,15 @@ async function withingsAuth(db, config, helpers, options = {}) {
   }
 
   const body = j.body;
-  const expiresIn = Number.parseInt(String(body.expires_in ?? 0), 10) || 0;
-  const expiresAt = expiresIn > 0 ? dtToIsoZ(new Date(Date.now() + expiresIn * 1000)) : null;
+  const expiresIn = parseIntSafe(body.expires_in, 0);
+  const expiresAtEpoch = expiresIn > 0 ? Math.floor(Date.now() / 1000) + expiresIn : null;
 
   db.setOAuthToken('withings', {
     accessToken: String(body.access_token),
     refreshToken: body.refresh_token || null,
     tokenType: body.token_type || 'Bearer',
     scope: body.scope || scopes.join(','),
-    expiresAt,
+    expiresAt: expiresAtEpoch,
     extra: {
       method: 'oauth',
     },
@@ -291,30 +287,18 @@ async function withingsAuth(db, config, helpers, options = {}) {
 }
 
 function watermarkEpoch(db, resource, overlapSeconds) {
-  const state = db.getSyncState('withings', resource);
-  const raw = state?.watermark;
-  const epoch = raw ? toEpochSeconds(raw) : 0;
-  return Math.max(0, (epoch || 0) - Math.max(0, overlapSeconds));
+  const epoch = db.getSyncWatermarkEpoch('withings', resource) ?? 0;
+  return Math.max(0, epoch - Math.max(0, overlapSeconds));
 }
 
 function parseOverlapSeconds(rawValue) {
-  const parsed = Number.parseInt(String(rawValue ?? 300), 10);
-  if (!Number.isFinite(parsed)) {
-    return 300;
-  }
-  return Math.max(0, parsed);
+  return Math.max(0, parseIntSafe(rawValue, 300));
 }
 
 function setWatermarkEpoch(db, resource, epoch) {
   const nowEpoch = Math.floor(Date.now() / 1000);
-  const wm = Math.max(0, Number.parseInt(String(epoch ?? nowEpoch), 10) || nowEpoch);
-  db.setSyncState('withings', resource, {
-    watermark: dtToIsoZ(new Date(wm * 1000)),
-  });
-}
-
-function serializeHashable(value) {
-  return JSON.stringify(value);
+  const wm = Math.max(0, parseIntSafe(epoch, nowEpoch) || nowEpoch);
+  db.setSyncWatermarkEpoch('withings', resource, wm);
 }
 
 function toSeriesArray(body) {
@@ -330,267 +314,232 @@ function toSeriesArray(body) {
   return [];
 }
 
-async function syncMeasures(db, token, cfg) {
-  await db.syncRun('withings', 'measures', async () => {
-    await db.transaction(async () => {
-      const overlapSeconds = parseOverlapSeconds(cfg.overlap_seconds);
-      const lastupdate = watermarkEpoch(db, 'measures', overlapSeconds);
-      const meastypes = Array.isArray(cfg.meastypes) && cfg.meastypes.length ? cfg.meastypes : DEFAULT_MEASTYPES;
-
-      let offset = 0;
-      let maxWm = Math.floor(Date.now() / 1000);
-
-      while (true) {
-        const data = {
-          action: 'getmeas',
-          meastype: meastypes.join(','),
-          category: '1',
-          lastupdate,
-        };
-        if (offset > 0) {
-          data.offset = offset;
-        }
-
-        const j = await requestJson(WITHINGS_MEASURE, {
-          method: 'POST',
-          headers: withingsHeaders(token),
-          data,
-        });
-
-        if (j?.status !== 0) {
-          throw new Error(`Withings measures sync failed: ${JSON.stringify(j)}`);
-        }
-
-        const body = j.body || {};
-        const groups = Array.isArray(body.measuregrps) ? body.measuregrps : [];
-        for (const grp of groups) {
-          const recordId = grp?.grpid
-            ? String(grp.grpid)
-            : sha256Hex(serializeHashable(grp));
-          const startTime = toIsoFromEpoch(grp?.date);
-          const sourceUpdatedAt = toIsoFromEpoch(grp?.modified);
-
-          db.upsertRecord({
-            provider: 'withings',
-            resource: 'measures',
-            recordId,
-            startTime,
-            endTime: null,
-            sourceUpdatedAt,
-            payload: grp,
-          });
-        }
-
-        const updatetime = Number.parseInt(String(body?.updatetime ?? 0), 10);
-        if (Number.isFinite(updatetime) && updatetime > 0) {
-          maxWm = Math.max(maxWm, updatetime);
-        }
-
-        if (!body?.more || body?.offset === undefined || body?.offset === null) {
-          break;
-        }
-        offset = Number.parseInt(String(body.offset), 10) || 0;
-        if (offset <= 0) {
-          break;
-        }
-      }
+function nextOffset(body) {
+  if (!body.more || body.offset === undefined || body.offset === null) {
+    return null;
+  }
+  const offset = parseIntSafe(body.offset, 0);
+  return offset > 0 ? offset : null;
+}
 
-      setWatermarkEpoch(db, 'measures', maxWm);
-    });
+function fetchWithingsPage(url, headers, form, label, offset, signal) {
+  const promise = requestJson(url, {
+    method: 'POST',
+    headers,
+    data: offset > 0 ? `${form}&offset=${offset}` : form,
+    signal,
+  }).then((j) => {
+    if (j?.status !== 0) {
+      const err = new Error(`Withings ${label} sync failed: ${JSON.stringify(j)}`);
+      err.status = j?.status;
+      throw err;
+    }
+    const body = j.body || {};
+    return { body, nextOffset: nextOffset(body) };
   });
+  // Rejections surface when the consumer reaches this page.
+  promise.catch(() => {});
+  return promise;
 }
 
-async function syncActivity(db, token, cfg) {
-  await db.syncRun('withings', 'activity', async () => {
-    await db.transaction(async () => {
-      const overlapSeconds = parseOverlapSeconds(cfg.overlap_seconds);
-      const lastupdate = watermarkEpoch(db, 'activity', overlapSeconds);
-
-      let offset = 0;
-      const maxWm = Math.floor(Date.now() / 1000);
-
-      while (true) {
-        const data = {
-          action: 'getactivity',
-          lastupdate,
-          data_fields: ACTIVITY_FIELDS.join(','),
-        };
-        if (offset > 0) {
-          data.offset = offset;
-        }
-
-        const j = await requestJson(WITHINGS_MEASURE_V2, {
-          method: 'POST',
-          headers: withingsHeaders(token),
-          data,
-        });
-
-        if (j?.status !== 0) {
-          throw new Error(`Withings activity sync failed: ${JSON.stringify(j)}`);
-        }
+async function* withingsPages({ firstPage, fetchPage }) {
+  let pending = firstPage;
+  while (pending) {
+    const page = await pending;
+    // Request the next page before handing this one to the writer so the
+    // round-trip overlaps the upsert, but never run more than one page ahead.
+    pending = page.nextOffset === null ? null : fetchPage(page.nextOffset);
+    yield page;
+  }
+}
 
-        const body = j.body || {};
-        const activities = toSeriesArray(body);
-        for (const act of activities) {
-          const recordId = act?.date || act?.id || sha256Hex(serializeHashable(act));
-          db.upsertRecord({
-            provider: 'withings',
-            resource: 'activity',
-            recordId: String(recordId),
-            startTime: act?.date || null,
-            endTime: null,
-            sourceUpdatedAt: null,
-            payload: act,
-          });
-        }
+function measureRow(grp) {
+  return {
+    provider: 'withings',
+    resource: 'measures',
+    recordId: grp?.grpid ? String(grp.grpid) : sha256Hex(JSON.stringify(grp)),
+    startTime: epochToIsoZ(grp?.date),
+    endTime: null,
+    sourceUpdatedAt: epochToIsoZ(grp?.modified),
+    payload: grp,
+  };
+}
 
-        if (!body?.more || body?.offset === undefined || body?.offset === null) {
-          break;
-        }
-        offset = Number.parseInt(String(body.offset), 10) || 0;
-        if (offset <= 0) {
-          break;
-        }
-      }
+function activityRow(act) {
+  const recordId = act?.date || act?.id || sha256Hex(JSON.stringify(act));
+  return {
+    provider: 'withings',
+    resource: 'activity',
+    recordId: String(recordId),
+    startTime: act?.date || null,
+    endTime: null,
+    sourceUpdatedAt: null,
+    payload: act,
+  };
+}
 
-      setWatermarkEpoch(db, 'activity', maxWm);
-    });
-  });
+function seriesRow(resource, entry) {
+  const recordId = entry?.id || entry?.startdate || sha256Hex(JSON.stringify(entry));
+  return {
+    provider: 'withings',
+    resource,
+    recordId: String(recordId),
+    startTime: epochToIsoZ(entry?.startdate),
+    endTime: epochToIsoZ(entry?.enddate),
+    sourceUpdatedAt: epochToIsoZ(entry?.modified),
+    payload: entry,
+  };
 }
 
-async function syncWorkouts(db, token, cfg) {
-  await db.syncRun('withings', 'workouts', async () => {
-    await db.transaction(async () => {
-      const overlapSeconds = parseOverlapSeconds(cfg.overlap_seconds);
-      const lastupdate = watermarkEpoch(db, 'workouts', overlapSeconds);
-
-      let offset = 0;
-      let maxWm = Math.floor(Date.now() / 1000);
-
-      while (true) {
-        const data = {
-          action: 'getworkouts',
-          lastupdate,
-          data_fields: WORKOUT_FIELDS.join(','),
-        };
-        if (offset > 0) {
-          data.offset = offset;
-        }
+function maxModifiedEpoch(entries, floor) {
+  let maxWm = floor;
+  for (const entry of entries) {
+    const modified = parseIntSafe(entry?.modified, 0);
+    if (modified > maxWm) {
+      maxWm = modified;
+    }
+  }
+  return maxWm;
+}
 
-        const j = await requestJson(WITHINGS_MEASURE_V2, {
-          method: 'POST',
-          headers: withingsHeaders(token),
-          data,
-        });
+const WITHINGS_RESOURCES = [
+  {
+    resource: 'measures',
+    label: 'measures',
+    url: WITHINGS_MEASURE,
+    params: (cfg) => ({
+      action: 'getmeas',
+      meastype: Array.isArray(cfg.meastypes) && cfg.meastypes.length
+        ? cfg.meastypes.join(',')
+        : DEFAULT_MEASTYPES_CSV,
+      category: '1',
+    }),
+    rows: (body) => (Array.isArray(body.measuregrps) ? body.measuregrps : []).map(measureRow),
+    pageEpoch: (body) => parseIntSafe(body.updatetime, 0),
+  },
+  {
+    resource: 'activity',
+    label: 'activity',
+    url: WITHINGS_MEASURE_V2,
+    params: () => ({ action: 'getactivity', data_fields: ACTIVITY_FIELDS_CSV }),
+    rows: (body) => toSeriesArray(body).map(activityRow),
+    pageEpoch: () => 0,
+  },
+  {
+    resource: 'workouts',
+    label: 'workouts',
+    url: WITHINGS_MEASURE_V2,
+    params: () => ({ action: 'getworkouts', data_fields: WORKOUT_FIELDS_CSV }),
+    rows: (body) => toSeriesArray(body).map((entry) => seriesRow('workouts', entry)),
+    pageEpoch: (body) => maxModifiedEpoch(toSeriesArray(body), 0),
+  },
+  {
+    resource: 'sleep_summary',
+    label: 'sleep summary',
+    url: WITHINGS_SLEEP_V2,
+    params: () => ({ action: 'getsummary', data_fields: SLEEP_SUMMARY_FIELDS_CSV }),
+    rows: (body) => toSeriesArray(body).map((entry) => seriesRow('sleep_summary', entry)),
+    pageEpoch: (body) => maxModifiedEpoch(toSeriesArray(body), 0),
+  },
+];
 
-        if (j?.status !== 0) {
-          throw new Error(`Withings workouts sync failed: ${JSON.stringify(j)}`);
-        }
+function fetchResource(db, headers, cfg, spec, signal) {
+  const lastupdate = watermarkEpoch(db, spec.resource, parseOverlapSeconds(cfg.overlap_seconds));
+  const resumeOffset = parseIntSafe(db.getSyncState('withings', spec.resource)?.cursor, 0);
+  // Encode the form once per resource; pages only append their offset.
+  const form = new URLSearchParams({ ...spec.params(cfg), lastupdate }).toString();
+  const fetchPage = (offset) => fetchWithingsPage(spec.url, headers, form, spec.label, offset, signal);
+  return { firstPage: fetchPage(Math.max(0, resumeOffset)), fetchPage };
+}
 
-        const body = j.body || {};
-        const workouts = toSeriesArray(body);
-        for (const workout of workouts) {
-          const recordId = workout?.id || workout?.startdate || sha256Hex(serializeHashable(workout));
-          const modified = Number.parseInt(String(workout?.modified ?? 0), 10);
-          if (Number.isFinite(modified) && modified > 0) {
-            maxWm = Math.max(maxWm, modified);
-          }
-
-          db.upsertRecord({
-            provider: 'withings',
-            resource: 'workouts',
-            recordId: String(recordId),
-            startTime: toIsoFromEpoch(workout?.startdate),
-            endTime: toIsoFromEpoch(workout?.enddate),
-            sourceUpdatedAt: toIsoFromEpoch(workout?.modified),
-            payload: workout,
+async function storeResource(db, spec, pages) {
+  await db.syncRun('withings', spec.resource, async () => {
+    const state = db.getSyncState('withings', spec.resource);
+    const resumedAt = state?.cursor ? parseIntSafe(state.extra?.started_at, 0) : 0;
+    const startedAt = resumedAt || Math.floor(Date.now() / 1000);
+    let maxWm = startedAt;
+
+    for await (const page of withingsPages(pages)) {
+      // A resumed run skipped the pages before its cursor, so it must not
+      // move the watermark past the time the interrupted run started.
+      if (!resumedAt) {
+        maxWm = Math.max(maxWm, spec.pageEpoch(page.body));
+      }
+      await db.transaction(async () => {
+        db.upsertRecords(spec.rows(page.body));
+        if (page.nextOffset === null) {
+          setWatermarkEpoch(db, spec.resource, maxWm);
+        } else {
+          db.setSyncState('withings', spec.resource, {
+            watermark: state?.watermarkEpoch ?? null,
+            cursor: String(page.nextOffset),
+            extra: { started_at: startedAt },
           });
         }
-
-        if (!body?.more || body?.offset === undefined || body?.offset === null) {
-          break;
-        }
-        offset = Number.parseInt(String(body.offset), 10) || 0;
-        if (offset <= 0) {
-          break;
-        }
-      }
-
-      setWatermarkEpoch(db, 'workouts', maxWm);
-    });
+      });
+    }
   });
 }
 
-async function syncSleepSummary(db, token, cfg) {
-  await db.syncRun('withings', 'sleep_summary', async () => {
-    await db.transaction(async () => {
-      const overlapSeconds = parseOverlapSeconds(cfg.overlap_seconds);
-      const lastupdate = watermarkEpoch(db, 'sleep_summary', overlapSeconds);
-
-      let offset = 0;
-      let maxWm = Math.floor(Date.now() / 1000);
-
-      while (true) {
-        const data = {
-          action: 'getsummary',
-          lastupdate,
-          data_fields: SLEEP_SUMMARY_FIELDS.join(','),
-        };
-        if (offset > 0) {
-          data.offset = offset;
-        }
-
-        const j = await requestJson(WITHINGS_SLEEP_V2, {
-          method: 'POST',
-          headers: withingsHeaders(token),
-          data,
-        });
-
-        if (j?.status !== 0) {
-          throw new Error(`Withings sleep summary sync failed: ${JSON.stringify(j)}`);
-        }
-
-        const body = j.body || {};
-        const entries = toSeriesArray(body);
-        for (const summary of entries) {
-          const recordId = summary?.id || summary?.startdate || sha256Hex(serializeHashable(summary));
-          const modified = Number.parseInt(String(summary?.modified ?? 0), 10);
-          if (Number.isFinite(modified) && modified > 0) {
-            maxWm = Math.max(maxWm, modified);
-          }
-
-          db.upsertRecord({
-            provider: 'withings',
-            resource: 'sleep_summary',
-            recordId: String(recordId),
-            startTime: toIsoFromEpoch(summary?.startdate),
-            endTime: toIsoFromEpoch(summary?.enddate),
-            sourceUpdatedAt: toIsoFromEpoch(summary?.modified),
-            payload: summary,
-          });
-        }
-
-        if (!body?.more || body?.offset === undefined || body?.offset === null) {
-          break;
-        }
-        offset = Number.parseInt(String(body.offset), 10) || 0;
-        if (offset <= 0) {
-          break;
-        }
-      }
-
-      setWatermarkEpoch(db, 'sleep_summary', maxWm);
-    });
-  });
+function recentlyPolled(db, resource, minPollSeconds, nowEpoch) {
+  if (minPollSeconds <= 0) {
+    return false;
+  }
+  const state = db.getSyncState('withings', resource);
+  if (!state) {
+    return false;
+  }
+  // Every completed sync moves the watermark up to at least its own start
+  // time, so a fresh watermark plus a fresh write means nothing is pending.
+  const cutoff = nowEpoch - minPollSeconds;
+  return (state.watermarkEpoch ?? 0) >= cutoff && (toEpochSeconds(state.updatedAt) ?? 0) >= cutoff;
 }
 
 async function withingsSync(db, config, helpers) {
   const cfg = helpers.configFor('withings');
-  const accessToken = await withingsRefreshIfNeeded(db, cfg);
-  await syncMeasures(db, accessToken, cfg);
-  await syncActivity(db, accessToken, cfg);
-  await syncWorkouts(db, accessToken, cfg);
-  await syncSleepSummary(db, accessToken, cfg);
+  const minPollSeconds = Math.max(0, parseIntSafe(cfg.min_poll_interval_seconds, 60));
+  const nowEpoch = Math.floor(Date.now() / 1000);
+  const due = WITHINGS_RESOURCES.filter(({ resource }) => {
+    if (!recentlyPolled(db, resource, minPollSeconds, nowEpoch)) {
+      return true;
+    }
+    console.log(`Skipping withings/${resource}: synced within the last ${minPollSeconds}s.`);
+    return false;
+  });
+  if (!due.length) {
+    return;
+  }
+
+  let headers = withingsHeaders(await withingsRefreshIfNeeded(db, cfg));
+  let aborter = null;
+  const fetchAll = (specs) => {
+    aborter = new AbortController();
+    return specs.map((spec) => ({ spec, pages: fetchResource(db, headers, cfg, spec, aborter.signal) }));
+  };
+
+  // The resources are independent API calls, so their first pages are
+  // requested together; later pages are only requested as the writer pulls
+  // them, and SQLite writes run one resource at a time.
+  let pending = fetchAll(due);
+  let retriedAuth = false;
+  while (pending.length) {
+    const { spec, pages } = pending[0];
+    try {
+      await storeResource(db, spec, pages);
+    } catch (err) {
+      // Whatever the other resources still have in flight is now unused.
+      aborter.abort();
+      if (err?.status !== 401 || retriedAuth || !cfg.client_id || !cfg.client_secret) {
+        throw err;
+      }
+      retriedAuth = true;
+      db.invalidateAccessToken('withings');
+      headers = withingsHeaders(await withingsRefreshIfNeeded(db, cfg, { force: true }));
+      pending = fetchAll(pending.map((entry) => entry.spec));
+      continue;
+    }
+    pending.shift();
+  }
 }
 
 const withingsProvider = {
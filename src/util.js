@@ -4,13 +4,52 @@ import readline from 'node:readline';
 import { spawn } from 'node:child_process';
 
 function stripMillis(isoString) {
-  return isoString.replace(/\.\d{3}Z$/, 'Z');
+  // toISOString() always ends in '.sssZ', so the suffix can be cut by length.
+  return `${isoString.slice(0, -5)}Z`;
 }
 
 export function utcNowIso() {
   return stripMillis(new Date().toISOString());
 }
 
+const DATE_PARSE_CACHE_MAX = 4096;
+const dateParseCache = new Map();
+
+function parseYmdMs(trimmed) {
+  const year = Number(trimmed.slice(0, 4));
+  const month = Number(trimmed.slice(5, 7));
+  const day = Number(trimmed.slice(8, 10));
+  if (month < 1 || month > 12 || day < 1 || day > 31) {
+    return Number.NaN;
+  }
+  if (year < 100) {
+    // Date.UTC maps two-digit years onto 19xx.
+    return Date.parse(`${trimmed}T00:00:00Z`);
+  }
+  return Date.UTC(year, month - 1, day);
+}
+
+function parseDateStringMs(trimmed) {
+  const cached = dateParseCache.get(trimmed);
+  if (cached !== undefined) {
+    dateParseCache.delete(trimmed);
+    dateParseCache.set(trimmed, cached);
+    return cached;
+  }
+  const ms = /^\d{4}-\d{2}-\d{2}$/.test(trimmed)
+    ? parseYmdMs(trimmed)
+    : Date.parse(trimmed);
+  dateParseCache.set(trimmed, ms);
+  if (dateParseCache.size > DATE_PARSE_CACHE_MAX) {
+    dateParseCache.delete(dateParseCache.keys().next().value);
+  }
+  return ms;
+}
+
+export function clearDateParseCache() {
+  dateParseCache.clear();
+}
+
 export function isoToDate(value) {
   if (value === null || value === undefined) {
     return null;
@@ -25,13 +64,8 @@ export function isoToDate(value) {
   if (!trimmed) {
     return null;
   }
-  if (/^\d{4}-\d{2}-\d{2}$/.test(trimmed)) {
-    const d = new Date(`${trimmed}T00:00:00Z`);
-    return Number.isNaN(d.getTime()) ? null : d;
-  }
-  const normalized = trimmed.endsWith('Z') ? trimmed : trimmed;
-  const d = new Date(normalized);
-  return Number.isNaN(d.getTime()) ? null : d;
+  const ms = parseDateStringMs(trimmed);
+  return Number.isNaN(ms) ? null : new Date(ms);
 }
 
 export function dtToIsoZ(value) {
@@ -42,6 +76,17 @@ export function dtToIsoZ(value) {
   return stripMillis(d.toISOString());
 }
 
+export function epochToIsoZ(epochSeconds) {
+  if (epochSeconds === null || epochSeconds === undefined) {
+    return null;
+  }
+  const ms = Math.floor(Number(epochSeconds)) * 1000;
+  if (!Number.isFinite(ms) || Math.abs(ms) > 8.64e15) {
+    return null;
+  }
+  return stripMillis(new Date(ms).toISOString());
+}
+
 export function parseYYYYMMDD(value) {
   if (typeof value !== 'string') {
     return null;
@@ -50,8 +95,8 @@ export function parseYYYYMMDD(value) {
   if (!/^\d{4}-\d{2}-\d{2}$/.test(trimmed)) {
     return null;
   }
-  const d = new Date(`${trimmed}T00:00:00Z`);
-  return Number.isNaN(d.getTime()) ? null : d;
+  const ms = parseDateStringMs(trimmed);
+  return Number.isNaN(ms) ? null : new Date(ms);
 }
 
 export function toEpochSeconds(value) {
@@ -72,23 +117,21 @@ export function toEpochSeconds(value) {
     if (/^\d+$/.test(trimmed)) {
       return Number.parseInt(trimmed, 10);
     }
-    if (/^\d{4}-\d{2}-\d{2}$/.test(trimmed)) {
-      const d = new Date(`${trimmed}T00:00:00Z`);
-      if (Number.isNaN(d.getTime())) {
-        return null;
-      }
-      return Math.floor(d.getTime() / 1000);
-    }
-    const d = new Date(trimmed);
-    if (Number.isNaN(d.getTime())) {
+    const ms = parseDateStringMs(trimmed);
+    if (Number.isNaN(ms)) {
       return null;
     }
-    return Math.floor(d.getTime() / 1000);
+    return Math.floor(ms / 1000);
   }
   return null;
 }
 
+const oneShotHash = typeof crypto.hash === 'function' ? crypto.hash : null;
+
 export function sha256Hex(value) {
+  if (oneShotHash) {
+    return oneShotHash('sha256', value, 'hex');
+  }
   return crypto.createHash('sha256').update(value).digest('hex');
 }
 
@@ -96,37 +139,100 @@ export function hmacSha256Hex(secret, value) {
   return crypto.createHmac('sha256', secret).update(value).digest('hex');
 }
 
+export function oauthStateMismatch(received, expected) {
+  if (!received) {
+    return false;
+  }
+  const a = Buffer.from(String(received), 'utf8');
+  const b = Buffer.from(String(expected), 'utf8');
+  return a.length !== b.length || !crypto.timingSafeEqual(a, b);
+}
+
+const SCOPE_SPLIT_RE = /[\s,]+/;
+
+export function splitScopes(rawScopes) {
+  return String(rawScopes || '').split(SCOPE_SPLIT_RE).filter(Boolean);
+}
+
 export function basicAuthHeader(username, password) {
   const token = Buffer.from(`${username}:${password}`, 'utf8').toString('base64');
   return `Basic ${token}`;
 }
 
-export function sleep(ms) {
-  return new Promise((resolve) => {
-    setTimeout(resolve, ms);
+export function sleep(ms, signal = null) {
+  return new Promise((resolve, reject) => {
+    if (signal?.aborted) {
+      reject(signal.reason);
+      return;
+    }
+    const onAbort = () => {
+      clearTimeout(timer);
+      reject(signal.reason);
+    };
+    const timer = setTimeout(() => {
+      signal?.removeEventListener('abort', onAbort);
+      resolve();
+    }, ms);
+    signal?.addEventListener('abort', onAbort, { once: true });
   });
 }
 
+export async function* mapConcurrentOrdered(items, concurrency, fn) {
+  const limit = Math.max(1, Math.floor(concurrency) || 1);
+  const pending = [];
+  let next = 0;
+
+  const launch = () => {
+    const index = next;
+    const promise = Promise.resolve().then(() => fn(items[index], index));
+    // Rejections are surfaced when the promise is awaited in order below.
+    promise.catch(() => {});
+    pending.push(promise);
+    next += 1;
+  };
+
+  while (next < items.length && pending.length < limit) {
+    launch();
+  }
+  while (pending.length) {
+    const result = await pending.shift();
+    if (next < items.length) {
+      launch();
+    }
+    yield result;
+  }
+}
+
 export function stableJsonStringify(value) {
-  const seen = new WeakSet();
+  const stack = [];
   const normalize = (node) => {
     if (node === null || typeof node !== 'object') {
       return node;
     }
-    if (seen.has(node)) {
+    if (stack.includes(node)) {
       throw new TypeError('Cannot stringify circular structures');
     }
-    seen.add(node);
+    stack.push(node);
+    let out;
     if (Array.isArray(node)) {
-      const out = node.map((item) => normalize(item));
-      seen.delete(node);
-      return out;
-    }
-    const out = {};
-    for (const key of Object.keys(node).sort()) {
-      out[key] = normalize(node[key]);
+      out = new Array(node.length);
+      for (let i = 0; i < node.length; i += 1) {
+        out[i] = normalize(node[i]);
+      }
+    } else {
+      const keys = Object.keys(node);
+      for (let i = 1; i < keys.length; i += 1) {
+        if (keys[i - 1] > keys[i]) {
+          keys.sort();
+          break;
+        }
+      }
+      out = {};
+      for (const key of keys) {
+        out[key] = normalize(node[key]);
+      }
     }
-    seen.delete(node);
+    stack.pop();
     return out;
   };
   return JSON.stringify(normalize(value));
@@ -170,6 +276,50 @@ function logRequestJson(message) {
     console.log(message);
   }
 }
+
+const ERROR_BODY_MAX_BYTES = 64 * 1024;
+
+// Connection-level failures worth retrying; DNS misses, TLS/certificate
+// errors and malformed requests fail the same way on every attempt.
+const TRANSIENT_NETWORK_CODES = new Set([
+  'ECONNRESET',
+  'ECONNREFUSED',
+  'ETIMEDOUT',
+  'EAI_AGAIN',
+  'EPIPE',
+  'UND_ERR_SOCKET',
+  'UND_ERR_CONNECT_TIMEOUT',
+  'UND_ERR_HEADERS_TIMEOUT',
+]);
+
+function parseJsonOrNull(text) {
+  try {
+    return JSON.parse(text);
+  } catch {
+    return null;
+  }
+}
+
+async function readBoundedText(response, maxBytes) {
+  if (!response.body) {
+    return '';
+  }
+  // Error pages can be large HTML dumps; only the head is used for the message.
+  const reader = response.body.getReader();
+  const chunks = [];
+  let size = 0;
+  while (size < maxBytes) {
+    const { done, value } = await reader.read();
+    if (done) {
+      return Buffer.concat(chunks).toString('utf8');
+    }
+    chunks.push(value);
+    size += value.byteLength;
+  }
+  await reader.cancel();
+  return Buffer.concat(chunks).subarray(0, maxBytes).toString('utf8');
+}
+
 function buildHttpError(method, url, response, parsedBody, rawText) {
   const detailCandidates = [];
   if (parsedBody && typeof parsedBody === 'object') {
@@ -194,6 +344,13 @@ function buildHttpError(method, url, response, parsedBody, rawText) {
   return err;
 }
 
+function withDefaultContentType(headers, contentType) {
+  if (Object.keys(headers).some((k) => k.toLowerCase() === 'content-type')) {
+    return headers;
+  }
+  return { ...headers, 'Content-Type': contentType };
+}
+
 export async function requestJson(url, options = {}) {
   const {
     method = 'GET',
@@ -205,6 +362,7 @@ export async function requestJson(url, options = {}) {
     retries = 5,
     retryBackoffMs = 1000,
     expectedStatus = null,
+    signal = null,
   } = options;
 
   const target = new URL(url);
@@ -217,13 +375,11 @@ export async function requestJson(url, options = {}) {
     }
   }
 
-  const requestHeaders = { ...headers };
+  let requestHeaders = headers ?? {};
   let body = undefined;
   if (json !== undefined) {
     body = JSON.stringify(json);
-    if (!Object.keys(requestHeaders).some((k) => k.toLowerCase() === 'content-type')) {
-      requestHeaders['Content-Type'] = 'application/json';
-    }
+    requestHeaders = withDefaultContentType(requestHeaders, 'application/json');
   } else if (data !== undefined) {
     if (data instanceof URLSearchParams) {
       body = data;
@@ -239,19 +395,20 @@ export async function requestJson(url, options = {}) {
     } else {
       body = String(data);
     }
-    if (!Object.keys(requestHeaders).some((k) => k.toLowerCase() === 'content-type')) {
-      requestHeaders['Content-Type'] = 'application/x-www-form-urlencoded';
-    }
+    requestHeaders = withDefaultContentType(requestHeaders, 'application/x-www-form-urlencoded');
   }
 
   let lastError = null;
   const maxAttempts = Math.max(1, retries);
   const requestLabel = `${method.toUpperCase()} ${target.toString()}`;
   for (let attempt = 1; attempt <= maxAttempts; attempt += 1) {
+    signal?.throwIfAborted();
     const controller = new AbortController();
     const timeout = setTimeout(() => {
       controller.abort(new Error(`Request timed out after ${timeoutMs}ms`));
     }, timeoutMs);
+    const abortFromCaller = () => controller.abort(signal.reason);
+    signal?.addEventListener('abort', abortFromCaller, { once: true });
 
     try {
       logRequestJson(`[http] -> ${requestLabel} (attempt ${attempt}/${maxAttempts})`);
@@ -263,39 +420,34 @@ export async function requestJson(url, options = {}) {
       });
 
       clearTimeout(timeout);
+      signal?.removeEventListener('abort', abortFromCaller);
       logRequestJson(`[http] <- ${response.status} ${response.statusText} ${requestLabel}`);
 
-      const rawText = await response.text();
-      let parsedBody = null;
-      if (rawText) {
-        try {
-          parsedBody = JSON.parse(rawText);
-        } catch {
-          parsedBody = null;
-        }
-      }
-
       const shouldRetry = response.status === 429 || (response.status >= 500 && response.status <= 599);
       if (shouldRetry && attempt < maxAttempts) {
+        // Drain without decoding so the keep-alive connection can be reused.
+        await response.arrayBuffer();
+        signal?.throwIfAborted();
         const retryAfterHeader = response.headers.get('retry-after');
         const retryAfterSeconds = parseRetryAfterSeconds(retryAfterHeader);
         const delayMs = retryAfterSeconds !== null
           ? Math.min(60000, Math.max(1000, retryAfterSeconds * 1000))
           : Math.min(60000, retryBackoffMs * (2 ** (attempt - 1)));
         logRequestJson(`[http] retry in ${delayMs}ms (${requestLabel})`);
-        await sleep(delayMs);
+        await sleep(delayMs, signal);
         continue;
       }
 
-      if (expectedStatus !== null) {
-        const allowed = Array.isArray(expectedStatus) ? expectedStatus : [expectedStatus];
-        if (!allowed.includes(response.status)) {
-          throw buildHttpError(method, target.toString(), response, parsedBody, rawText);
-        }
-      } else if (!response.ok) {
-        throw buildHttpError(method, target.toString(), response, parsedBody, rawText);
+      const statusAllowed = expectedStatus === null
+        ? response.ok
+        : (Array.isArray(expectedStatus) ? expectedStatus : [expectedStatus]).includes(response.status);
+      if (!statusAllowed) {
+        const errorText = await readBoundedText(response, ERROR_BODY_MAX_BYTES);
+        throw buildHttpError(method, target.toString(), response, parseJsonOrNull(errorText), errorText);
       }
 
+      const rawText = response.status === 204 ? '' : await response.text();
+      const parsedBody = rawText ? parseJsonOrNull(rawText) : null;
       if (!rawText) {
         return {};
       }
@@ -305,24 +457,26 @@ export async function requestJson(url, options = {}) {
       return parsedBody;
     } catch (error) {
       clearTimeout(timeout);
+      signal?.removeEventListener('abort', abortFromCaller);
       lastError = error;
       const status = error?.status;
+      const networkFailure = status === undefined
+        && TRANSIENT_NETWORK_CODES.has(error?.cause?.code ?? error?.code);
+      const timedOut = controller.signal.aborted && !signal?.aborted;
       const retryable = (status === 429 || (status >= 500 && status <= 599))
         || error?.name === 'AbortError'
-        || error?.cause?.code === 'ECONNRESET'
-        || error?.cause?.code === 'ETIMEDOUT';
-      if (attempt < maxAttempts && retryable) {
+        || timedOut
+        || networkFailure;
+      if (attempt < maxAttempts && retryable && !signal?.aborted) {
         const delayMs = Math.min(60000, retryBackoffMs * (2 ** (attempt - 1)));
         logRequestJson(`[http] error ${error?.message || String(error)}; retry in ${delayMs}ms (${requestLabel})`);
-        await sleep(delayMs);
+        await sleep(delayMs, signal);
         continue;
       }
-      if (attempt >= maxAttempts) {
-        if (error instanceof Error) {
-          throw error;
-        }
-        throw new Error(`Request failed for ${method.toUpperCase()} ${target.toString()}`, { cause: error });
+      if (error instanceof Error) {
+        throw error;
       }
+      throw new Error(`Request failed for ${method.toUpperCase()} ${target.toString()}`, { cause: error });
     }
   }
 
@@ -354,6 +508,10 @@ function oauthResultFromQueryParams(params) {
   });
 }
 
+const PASTED_URL_RE = /^https?:\/\//i;
+const PASTED_QUERY_KEY_RE = /^(code=|state=|error=)/;
+const WHITESPACE_RE = /\s/;
+
 export function oauthResultFromPaste(text) {
   if (typeof text !== 'string') {
     return null;
@@ -366,7 +524,7 @@ export function oauthResultFromPaste(text) {
   const parsedParamSets = [];
   let looksStructured = false;
 
-  if (/^https?:\/\//i.test(trimmed)) {
+  if (PASTED_URL_RE.test(trimmed)) {
     looksStructured = true;
     try {
       const url = new URL(trimmed);
@@ -390,7 +548,7 @@ export function oauthResultFromPaste(text) {
     parsedParamSets.push(new URLSearchParams(trimmed.slice(1)));
   } else if (
     trimmed.includes('=')
-    && (trimmed.includes('&') || /^(code=|state=|error=)/.test(trimmed))
+    && (trimmed.includes('&') || PASTED_QUERY_KEY_RE.test(trimmed))
   ) {
     looksStructured = true;
     parsedParamSets.push(new URLSearchParams(trimmed));
@@ -407,7 +565,7 @@ export function oauthResultFromPaste(text) {
     return null;
   }
 
-  if (/\s/.test(trimmed)) {
+  if (WHITESPACE_RE.test(trimmed)) {
     return null;
   }
 
@@ -427,6 +585,28 @@ function tryOpen(command, args, url) {
   }
 }
 
+const REDIRECT_URI_CACHE_MAX = 16;
+const redirectUriCache = new Map();
+
+export function parseRedirectUri(redirectUri) {
+  const cached = redirectUriCache.get(redirectUri);
+  if (cached) {
+    return cached;
+  }
+  const parsed = new URL(redirectUri);
+  const redirect = Object.freeze({
+    host: parsed.hostname,
+    port: parsed.port ? Number.parseInt(parsed.port, 10) : (parsed.protocol === 'https:' ? 443 : 80),
+    path: parsed.pathname || '/callback',
+    uri: parsed.toString(),
+  });
+  redirectUriCache.set(redirectUri, redirect);
+  if (redirectUriCache.size > REDIRECT_URI_CACHE_MAX) {
+    redirectUriCache.delete(redirectUriCache.keys().next().value);
+  }
+  return redirect;
+}
+
 export function openInBrowser(url) {
   if (!url) {
     return false;
@@ -508,6 +688,8 @@ export async function oauthListenForCode(options = {}) {
       }
       res.statusCode = 200;
       res.setHeader('Content-Type', 'text/html; charset=utf-8');
+      // Drop the browser's keep-alive socket so server.close() can finish right away.
+      res.setHeader('Connection', 'close');
       res.end('<html><body><h3>Authentication complete.</h3><p>You can close this tab.</p></body></html>');
       resolveOnce(parsed);
     } catch (err) {
@@ -72,11 +72,36 @@ test('setOAuthToken persists credentials in .health-sync.creds', (t) => {
   const creds = JSON.parse(fs.readFileSync(db.credsPath, 'utf8'));
   assert.equal(creds.tokens.oura.accessToken, 'token-a');
   assert.equal(creds.tokens.oura.refreshToken, 'refresh-a');
+  assert.equal(creds.tokens.oura.expiresAtEpoch, 1798761600);
+  assert.equal(db.getOAuthToken('oura').expiresAtEpoch, 1798761600);
 
   const row = db.conn.prepare('SELECT COUNT(*) AS count FROM oauth_tokens WHERE provider = ?').get('oura');
   assert.equal(Number(row?.count ?? 0), 0);
 });
 
+test('access token cache is bounded by expiry and cleared on token writes', (t) => {
+  const db = withDb(t);
+  const nowEpoch = Math.floor(Date.now() / 1000);
+
+  assert.equal(db.cachedAccessToken('oura'), null);
+  db.cacheAccessToken('oura', 'token-a', nowEpoch + 3600);
+  assert.equal(db.cachedAccessToken('oura'), 'token-a');
+
+  db.cacheAccessToken('strava', 'token-b', nowEpoch + 30);
+  assert.equal(db.cachedAccessToken('strava'), null);
+
+  db.setOAuthToken('oura', { accessToken: 'token-c' });
+  assert.equal(db.cachedAccessToken('oura'), null);
+});
+
+test('connections open in WAL mode with cache pragmas applied', (t) => {
+  const db = withDb(t);
+  assert.equal(db.conn.pragma('journal_mode', { simple: true }), 'wal');
+  assert.equal(db.conn.pragma('synchronous', { simple: true }), 1);
+  assert.equal(db.conn.pragma('busy_timeout', { simple: true }), 30000);
+  assert.equal(db.conn.pragma('cache_size', { simple: true }), -65536);
+});
+
 test('init migrates legacy oauth_tokens table rows into .health-sync.creds', (t) => {
   const dir = makeTempDir();
   const dbPath = dbPathFor(dir);
@@ -101,6 +126,7 @@ test('init migrates legacy oauth_tokens table rows into .health-sync.creds', (t)
   assert.ok(token);
   assert.equal(token.accessToken, 'legacy-access');
   assert.equal(token.refreshToken, 'legacy-refresh');
+  assert.equal(token.expiresAtEpoch, 1798761600);
 
   const creds = JSON.parse(fs.readFileSync(db.credsPath, 'utf8'));
   assert.equal(creds.tokens.withings.accessToken, 'legacy-access');
@@ -142,6 +168,56 @@ test('watermark normalization supports epoch and date values', (t) => {
   assert.equal(stDate.watermark, '2026-02-11T00:00:00Z');
 });
 
+test('sync_state stores integer watermark epochs and migrates older schemas', (t) => {
+  const dir = makeTempDir();
+  const dbPath = dbPathFor(dir);
+
+  const legacy = new HealthSyncDb(dbPath);
+  legacy.conn.exec(`
+    CREATE TABLE sync_state (
+      provider TEXT NOT NULL,
+      resource TEXT NOT NULL,
+      watermark TEXT,
+      cursor TEXT,
+      extra_json TEXT,
+      updated_at TEXT NOT NULL,
+      PRIMARY KEY (provider, resource)
+    );
+    INSERT INTO sync_state(provider, resource, watermark, updated_at)
+    VALUES ('strava', 'activities', '2026-02-10T09:30:52Z', '2026-02-10T09:30:52Z');
+  `);
+  legacy.close();
+
+  const db = new HealthSyncDb(dbPath);
+  db.init();
+  t.after(() => {
+    db.close();
+    removeDir(dir);
+  });
+
+  assert.equal(db.getSyncWatermarkEpoch('strava', 'activities'), 1770715852);
+
+  db.setSyncWatermarkEpoch('oura', 'heartrate', 1770715852);
+  const row = db.conn.prepare(`
+    SELECT watermark, watermark_epoch FROM sync_state WHERE provider = 'oura' AND resource = 'heartrate'
+  `).get();
+  assert.equal(row.watermark, '2026-02-10T09:30:52Z');
+  assert.equal(row.watermark_epoch, 1770715852);
+  assert.equal(db.getSyncState('oura', 'heartrate').watermarkEpoch, 1770715852);
+});
+
+test('getSyncState trusts the text watermark over a stale epoch column', (t) => {
+  const db = withDb(t);
+  db.setSyncWatermarkEpoch('strava', 'activities', 1770715852);
+  db.conn.prepare(`
+    UPDATE sync_state SET watermark = '2026-03-01T00:00:00Z' WHERE provider = 'strava' AND resource = 'activities'
+  `).run();
+
+  const state = db.getSyncState('strava', 'activities');
+  assert.equal(state.watermark, '2026-03-01T00:00:00Z');
+  assert.equal(state.watermarkEpoch, Date.parse('2026-03-01T00:00:00Z') / 1000);
+});
+
 test('syncRun records counts and success status', async (t) => {
   const db = withDb(t);
 
@@ -177,6 +253,57 @@ test('syncRun records counts and success status', async (t) => {
   assert.equal(run.watermarkAfter, '2026-02-12T00:00:00Z');
 });
 
+test('upsertRecords applies a batch and aggregates run counts', async (t) => {
+  const db = withDb(t);
+  const row = (recordId, score) => ({
+    provider: 'oura',
+    resource: 'daily_sleep',
+    recordId,
+    payload: { id: recordId, score },
+    startTime: recordId,
+  });
+
+  await db.syncRun('oura', 'daily_sleep', async () => {
+    await db.transaction(async () => {
+      assert.deepEqual(
+        db.upsertRecords([row('2026-02-10', 70), row('2026-02-11', 80)]),
+        { inserted: 2, updated: 0, unchanged: 0 },
+      );
+      assert.deepEqual(
+        db.upsertRecords([row('2026-02-10', 70), row('2026-02-11', 85), row('2026-02-12', 90)]),
+        { inserted: 1, updated: 1, unchanged: 1 },
+      );
+      assert.deepEqual(
+        db.upsertRecords([row('2026-02-13', 60), row('2026-02-13', 60)]),
+        { inserted: 1, updated: 0, unchanged: 1 },
+      );
+    });
+  });
+
+  const [run] = db.listRecentSyncRuns(1);
+  assert.equal(run.insertedCount, 4);
+  assert.equal(run.updatedCount, 1);
+  assert.equal(run.unchangedCount, 2);
+});
+
+test('upsertRecord stores a pre-serialized payloadJson as-is', (t) => {
+  const db = withDb(t);
+  const record = {
+    provider: 'oura',
+    resource: 'heartrate',
+    recordId: 'hr-1',
+    payload: { bpm: 60, timestamp: '2026-02-11T00:00:00Z' },
+    payloadJson: '{"bpm":60,"timestamp":"2026-02-11T00:00:00Z"}',
+  };
+
+  assert.equal(db.upsertRecord(record), 'inserted');
+  assert.equal(db.upsertRecord({ ...record, payloadJson: undefined }), 'unchanged');
+  const row = db.conn.prepare(`
+    SELECT payload_json FROM records WHERE provider = 'oura' AND resource = 'heartrate' AND record_id = 'hr-1'
+  `).get();
+  assert.equal(row.payload_json, record.payloadJson);
+});
+
 test('syncRun records error status and error text', async (t) => {
   const db = withDb(t);
 
@@ -203,6 +330,30 @@ test('syncRun records error status and error text', async (t) => {
   assert.match(String(run.errorText), /boom/);
 });
 
+test('syncRun reuses the starting sync state until the provider writes it', async (t) => {
+  const db = withDb(t);
+  db.setSyncState('oura', 'daily_sleep', { watermark: '2026-02-10' });
+
+  await db.syncRun('oura', 'daily_sleep', async () => {
+    const first = db.getSyncState('oura', 'daily_sleep');
+    assert.equal(db.getSyncState('oura', 'daily_sleep'), first);
+
+    await assert.rejects(() => db.transaction(async () => {
+      db.setSyncState('oura', 'daily_sleep', { watermark: '2026-02-11' });
+      throw new Error('rollback');
+    }), /rollback/);
+    assert.equal(db.getSyncState('oura', 'daily_sleep').watermark, '2026-02-10T00:00:00Z');
+
+    db.setSyncState('oura', 'daily_sleep', { watermark: '2026-02-12' });
+    assert.equal(db.getSyncState('oura', 'daily_sleep').watermark, '2026-02-12T00:00:00Z');
+  });
+
+  db.conn.prepare('UPDATE sync_state SET watermark = ? WHERE provider = ? AND resource = ?')
+    .run('2026-02-13T00:00:00Z', 'oura', 'daily_sleep');
+  assert.equal(db.getSyncState('oura', 'daily_sleep').watermark, '2026-02-13T00:00:00Z');
+  assert.equal(db.listRecentSyncRuns(1)[0].watermarkAfter, '2026-02-12T00:00:00Z');
+});
+
 test('init aborts stale running sync runs and reconcile can abort remaining running runs', (t) => {
   const dir = makeTempDir();
   const dbPath = dbPathFor(dir);
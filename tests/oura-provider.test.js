@@ -70,6 +70,113 @@ test('oura sleep endpoint uses next-day end_date window', async (t) => {
   assert.equal(sleep[0].params.end_date, tomorrow);
 });
 
+test('oura date-window resources follow next_token pages', async (t) => {
+  const today = new Date().toISOString().slice(0, 10);
+  const { db, config, helpers } = withDbAndConfig(t, { start_date: today });
+
+  db.setOAuthToken('oura', {
+    accessToken: 'cached-token',
+    refreshToken: null,
+    tokenType: 'Bearer',
+    scope: 'extapi:daily',
+    expiresAt: isoNowPlusSeconds(3600),
+  });
+
+  const workoutTokens = [];
+  withFetchMock(t, async (input) => {
+    const url = input instanceof URL ? input : new URL(String(input));
+    if (url.pathname.endsWith('/v2/usercollection/personal_info')) {
+      return jsonResponse({});
+    }
+    if (url.pathname.endsWith('/v2/usercollection/workout')) {
+      const nextToken = url.searchParams.get('next_token');
+      workoutTokens.push(nextToken);
+      if (!nextToken) {
+        return jsonResponse({ data: [{ id: 'w1', day: today }], next_token: 'page-2' });
+      }
+      return jsonResponse({ data: [{ id: 'w2', day: today }], next_token: null });
+    }
+    return jsonResponse({ data: [] });
+  });
+
+  await ouraProvider.sync(db, config, helpers);
+
+  assert.deepEqual(workoutTokens, [null, 'page-2']);
+  const rows = db.conn.prepare(`
+    SELECT record_id FROM records WHERE provider = 'oura' AND resource = 'workout' ORDER BY record_id
+  `).all();
+  assert.deepEqual(rows.map((row) => row.record_id), ['w1', 'w2']);
+});
+
+test('oura fallback record ids keep the legacy payload hash', async (t) => {
+  const today = new Date().toISOString().slice(0, 10);
+  const { db, config, helpers } = withDbAndConfig(t, { start_date: today });
+
+  db.setOAuthToken('oura', {
+    accessToken: 'cached-token',
+    refreshToken: null,
+    tokenType: 'Bearer',
+    scope: 'extapi:daily',
+    expiresAt: isoNowPlusSeconds(3600),
+  });
+
+  withFetchMock(t, async (input) => {
+    const url = input instanceof URL ? input : new URL(String(input));
+    if (url.pathname.endsWith('/v2/usercollection/personal_info')) {
+      return jsonResponse({});
+    }
+    if (url.pathname.endsWith('/v2/usercollection/workout')) {
+      return jsonResponse({ data: [{ source: 'manual', score: 80 }] });
+    }
+    return jsonResponse({ data: [] });
+  });
+
+  await ouraProvider.sync(db, config, helpers);
+
+  const rows = db.conn.prepare(`
+    SELECT record_id FROM records WHERE provider = 'oura' AND resource = 'workout'
+  `).all();
+  assert.deepEqual(rows.map((row) => row.record_id), [
+    '9d0fac6c43f2c626361d1fe60a3168d01a618a99dbf205f415c021f2f0b6c9f6',
+  ]);
+});
+
+test('oura aborts sibling heartrate windows when one window fails', async (t) => {
+  const startDate = new Date(Date.now() - 200 * 24 * 60 * 60 * 1000).toISOString().slice(0, 10);
+  const { db, config, helpers } = withDbAndConfig(t, { start_date: startDate });
+
+  db.setOAuthToken('oura', {
+    accessToken: 'cached-token',
+    refreshToken: null,
+    tokenType: 'Bearer',
+    scope: 'extapi:daily',
+    expiresAt: isoNowPlusSeconds(3600),
+  });
+
+  const windowSignals = [];
+  withFetchMock(t, async (input, options = {}) => {
+    const url = input instanceof URL ? input : new URL(String(input));
+    if (url.pathname.endsWith('/v2/usercollection/personal_info')) {
+      return jsonResponse({});
+    }
+    if (!url.pathname.endsWith('/v2/usercollection/heartrate')) {
+      return jsonResponse({ data: [] });
+    }
+    if (!windowSignals.length) {
+      windowSignals.push(null);
+      return jsonResponse({ detail: 'bad window' }, { status: 400 });
+    }
+    windowSignals.push(options.signal);
+    return new Promise((resolve, reject) => {
+      options.signal.addEventListener('abort', () => reject(options.signal.reason), { once: true });
+    });
+  });
+
+  await assert.rejects(() => ouraProvider.sync(db, config, helpers), /HTTP 400/);
+  assert.equal(windowSignals.length, 4);
+  assert.ok(windowSignals.slice(1).every((signal) => signal.aborted));
+});
+
 test('oura sync raises helpful error when oauth token is missing', async (t) => {
   const { db, config, helpers } = withDbAndConfig(t);
   withFetchMock(t, async () => {
@@ -147,5 +254,81 @@ test('oura expired oauth token is refreshed and persisted', async (t) => {
   assert.equal(token.refreshToken, 'new-refresh');
   assert.equal(token.scope, 'new-scope');
   assert.ok(token.expiresAt);
+  assert.equal(token.expiresAtEpoch, Date.parse(token.expiresAt) / 1000);
+  assert.ok(Math.abs(token.expiresAtEpoch - (Date.now() / 1000 + 3600)) < 5);
   assert.equal(token.extra.provider_user_id, '123');
 });
+
+test('oura refreshes once and retries when a cached token is rejected', async (t) => {
+  const today = new Date().toISOString().slice(0, 10);
+  const { db, config, helpers } = withDbAndConfig(t, { start_date: today });
+
+  db.setOAuthToken('oura', {
+    accessToken: 'revoked-access',
+    refreshToken: 'old-refresh',
+    tokenType: 'Bearer',
+    scope: 'extapi:daily',
+    expiresAt: isoNowPlusSeconds(3600),
+  });
+
+  let tokenRequests = 0;
+  const personalInfoAuth = [];
+  withFetchMock(t, async (input, options = {}) => {
+    const url = input instanceof URL ? input : new URL(String(input));
+    if (url.pathname.endsWith('/oauth/v2/ext/oauth-token')) {
+      tokenRequests += 1;
+      return jsonResponse({
+        access_token: 'new-access',
+        refresh_token: 'new-refresh',
+        token_type: 'Bearer',
+        expires_in: 3600,
+      });
+    }
+    if (url.pathname.endsWith('/v2/usercollection/personal_info')) {
+      const auth = new Headers(options.headers).get('authorization');
+      personalInfoAuth.push(auth);
+      if (auth === 'Bearer revoked-access') {
+        return jsonResponse({ detail: 'unauthorized' }, { status: 401 });
+      }
+      return jsonResponse({});
+    }
+    return jsonResponse({ data: [] });
+  });
+
+  await ouraProvider.sync(db, config, helpers);
+
+  assert.equal(tokenRequests, 1);
+  assert.equal(personalInfoAuth[0], 'Bearer revoked-access');
+  assert.equal(personalInfoAuth.at(-1), 'Bearer new-access');
+  assert.equal(db.getOAuthToken('oura').accessToken, 'new-access');
+  assert.equal(db.cachedAccessToken('oura'), 'new-access');
+});
+
+test('oura skips date-window requests when start_date is after end_date', async (t) => {
+  const future = new Date(Date.now() + 10 * 24 * 60 * 60 * 1000).toISOString().slice(0, 10);
+  const { db, config, helpers } = withDbAndConfig(t, { start_date: future });
+
+  db.setOAuthToken('oura', {
+    accessToken: 'cached-token',
+    refreshToken: null,
+    tokenType: 'Bearer',
+    scope: 'extapi:daily',
+    expiresAt: isoNowPlusSeconds(3600),
+  });
+
+  const calls = [];
+  withFetchMock(t, async (input) => {
+    const url = input instanceof URL ? input : new URL(String(input));
+    calls.push(url.pathname);
+    if (url.pathname.endsWith('/v2/usercollection/personal_info')) {
+      return jsonResponse({});
+    }
+    return jsonResponse({ data: [] });
+  });
+
+  await ouraProvider.sync(db, config, helpers);
+
+  assert.equal(calls.filter((p) => p.endsWith('/v2/usercollection/daily_sleep')).length, 0);
+  assert.equal(calls.filter((p) => p.endsWith('/v2/usercollection/sleep')).length, 0);
+  assert.equal(db.getSyncState('oura', 'daily_sleep'), null);
+});
@@ -162,3 +162,171 @@ test('strava sync removes locally stale activities not returned by API', async (
   assert.ok(activityRun);
   assert.equal(activityRun.deletedCount, 1);
 });
+
+test('strava prefetches activity pages but stores them in page order', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, { start_date: '2026-02-01', page_size: 2 });
+  const pages = {
+    1: [{ id: 1, start_date: '2026-02-02T10:00:00Z' }, { id: 2, start_date: '2026-02-03T10:00:00Z' }],
+    2: [{ id: 3, start_date: '2026-02-04T10:00:00Z' }, { id: 4, start_date: '2026-02-05T10:00:00Z' }],
+    3: [{ id: 5, start_date: '2026-02-06T10:00:00Z' }],
+  };
+  const requestedPages = [];
+  installStravaFetch(t, async (url) => {
+    const page = Number(url.searchParams.get('page'));
+    requestedPages.push(page);
+    if (page === 2) {
+      await new Promise((resolve) => setTimeout(resolve, 10));
+    }
+    return pages[page] || [];
+  });
+
+  await stravaProvider.sync(db, config, helpers);
+
+  assert.equal(requestedPages[0], 1);
+  assert.ok(requestedPages.includes(3));
+  const rows = db.conn.prepare(`
+    SELECT record_id FROM records WHERE provider = 'strava' AND resource = 'activities' ORDER BY CAST(record_id AS INTEGER)
+  `).all();
+  assert.deepEqual(rows.map((row) => row.record_id), ['1', '2', '3', '4', '5']);
+  assert.equal(db.getSyncState('strava', 'activities').watermark, '2026-02-06T10:00:00Z');
+});
+
+test('strava resumes an interrupted backfill from its checkpoint', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, { start_date: '2026-02-01', page_size: 2 });
+  db.upsertRecord({
+    provider: 'strava',
+    resource: 'activities',
+    recordId: '999',
+    startTime: '2026-02-01T10:00:00Z',
+    sourceUpdatedAt: '2026-02-01T10:00:00Z',
+    payload: { id: 999, start_date: '2026-02-01T10:00:00Z' },
+  });
+  let failLaterPages = true;
+  const seenAfter = installStravaFetch(t, async (url) => {
+    const page = url.searchParams.get('page');
+    if (url.searchParams.get('after') === String(Date.parse('2026-02-01T00:00:00Z') / 1000) && page === '1') {
+      return [{ id: 1, start_date: '2026-02-02T10:00:00Z' }, { id: 2, start_date: '2026-02-03T10:00:00Z' }];
+    }
+    if (failLaterPages) {
+      throw new Error('upstream failure');
+    }
+    return page === '1' ? [{ id: 3, start_date: '2026-02-04T10:00:00Z' }] : [];
+  });
+
+  await assert.rejects(() => stravaProvider.sync(db, config, helpers), /upstream failure/);
+
+  const listIds = () => db.conn.prepare(`
+    SELECT record_id FROM records WHERE provider = 'strava' AND resource = 'activities' ORDER BY CAST(record_id AS INTEGER)
+  `).all().map((row) => row.record_id);
+  assert.deepEqual(listIds(), ['1', '2', '999']);
+  const interrupted = db.getSyncState('strava', 'activities');
+  assert.equal(interrupted.watermark, null);
+  const checkpoint = Date.parse('2026-02-03T10:00:00Z') / 1000;
+  assert.equal(interrupted.cursor, String(checkpoint));
+
+  failLaterPages = false;
+  await stravaProvider.sync(db, config, helpers);
+
+  assert.equal(seenAfter.at(-1), String(checkpoint - 1));
+  assert.deepEqual(listIds(), ['1', '2', '3', '999']);
+  const finished = db.getSyncState('strava', 'activities');
+  assert.equal(finished.cursor, null);
+  assert.equal(finished.watermark, '2026-02-04T10:00:00Z');
+});
+
+test('strava refreshes once and retries when a cached token is rejected', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, {
+    access_token: '',
+    client_id: 'strava-client',
+    client_secret: 'strava-secret',
+  });
+  db.setOAuthToken('strava', {
+    accessToken: 'revoked-access',
+    refreshToken: 'old-refresh',
+    tokenType: 'Bearer',
+    expiresAt: new Date(Date.now() + 3600 * 1000).toISOString(),
+  });
+
+  const newExpiresAt = Math.floor(Date.now() / 1000) + 3600;
+  let tokenRequests = 0;
+  const athleteAuth = [];
+  withFetchMock(t, async (input, options = {}) => {
+    const url = input instanceof URL ? input : new URL(String(input));
+    if (url.pathname.endsWith('/oauth/token')) {
+      tokenRequests += 1;
+      return jsonResponse({
+        access_token: 'new-access',
+        refresh_token: 'new-refresh',
+        token_type: 'Bearer',
+        expires_at: newExpiresAt,
+      });
+    }
+    const auth = new Headers(options.headers).get('authorization');
+    if (url.pathname.endsWith('/api/v3/athlete')) {
+      athleteAuth.push(auth);
+      if (auth === 'Bearer revoked-access') {
+        return jsonResponse({ message: 'Authorization Error' }, { status: 401 });
+      }
+      return jsonResponse({ id: 123 });
+    }
+    assert.equal(auth, 'Bearer new-access');
+    return jsonResponse([]);
+  });
+
+  await stravaProvider.sync(db, config, helpers);
+
+  assert.equal(tokenRequests, 1);
+  assert.deepEqual(athleteAuth, ['Bearer revoked-access', 'Bearer new-access']);
+  const stored = db.getOAuthToken('strava');
+  assert.equal(stored.accessToken, 'new-access');
+  assert.equal(stored.expiresAtEpoch, newExpiresAt);
+  assert.equal(Date.parse(stored.expiresAt) / 1000, newExpiresAt);
+});
+
+test('strava activities without an id keep the legacy payload hash', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t);
+  installStravaFetch(t, async () => [{ start_date: '2026-02-10T00:00:00Z', name: 'Ride' }]);
+
+  await stravaProvider.sync(db, config, helpers);
+
+  const rows = db.conn.prepare(`
+    SELECT record_id FROM records WHERE provider = 'strava' AND resource = 'activities'
+  `).all();
+  assert.deepEqual(rows.map((row) => row.record_id), [
+    'fa9cdb7abbfbac0640b6f4044f51a839b531509f415c94dd892d0b7beff5ad8d',
+  ]);
+});
+
+test('strava keeps a small prefetch window and aborts unused pages', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, { start_date: '2026-02-01', page_size: 100 });
+  const activities = Array.from({ length: 250 }, (_, i) => ({
+    id: i + 1,
+    start_date: new Date(Date.UTC(2026, 1, 2) + i * 60000).toISOString(),
+  }));
+  const requestedPages = [];
+  const signals = [];
+  withFetchMock(t, async (input, options = {}) => {
+    const url = input instanceof URL ? input : new URL(String(input));
+    if (url.pathname.endsWith('/api/v3/athlete')) {
+      return jsonResponse({ id: 123 });
+    }
+    const page = Number(url.searchParams.get('page'));
+    requestedPages.push(page);
+    if (page > 3) {
+      signals.push(options.signal);
+      return new Promise((resolve, reject) => {
+        options.signal.addEventListener('abort', () => reject(options.signal.reason), { once: true });
+      });
+    }
+    return jsonResponse(activities.slice((page - 1) * 100, page * 100));
+  });
+
+  await stravaProvider.sync(db, config, helpers);
+
+  assert.ok(Math.max(...requestedPages) <= 4);
+  assert.ok(signals.length > 0 && signals.every((signal) => signal.aborted));
+  const { n } = db.conn.prepare(`
+    SELECT COUNT(*) AS n FROM records WHERE provider = 'strava' AND resource = 'activities'
+  `).get();
+  assert.equal(n, 250);
+});
@@ -49,6 +49,7 @@ export function baseConfig(overrides = {}) {
       redirect_uri: 'http://127.0.0.1:8485/callback',
       scopes: 'user.metrics,user.activity',
       overlap_seconds: 300,
+      min_poll_interval_seconds: 60,
       meastypes: null,
     },
     hevy: {
@@ -1,11 +1,24 @@
 import assert from 'node:assert/strict';
+import http from 'node:http';
 import test from 'node:test';
 
 import {
+  clearDateParseCache,
+  dtToIsoZ,
+  epochToIsoZ,
+  isoToDate,
+  mapConcurrentOrdered,
+  oauthListenForCode,
   oauthResultFromPaste,
+  oauthStateMismatch,
+  parseRedirectUri,
   parseRetryAfterSeconds,
   requestJson,
+  sha256Hex,
+  splitScopes,
+  stableJsonStringify,
   toEpochSeconds,
+  utcNowIso,
 } from '../src/util.js';
 import { jsonResponse, withFetchMock } from './test-helpers.js';
 
@@ -40,6 +53,24 @@ test('toEpochSeconds accepts epoch, ISO, and date strings', () => {
   assert.equal(toEpochSeconds('2026-02-10'), 1770681600);
 });
 
+test('mapConcurrentOrdered yields results in input order with bounded concurrency', async () => {
+  let active = 0;
+  let peak = 0;
+  const delays = [30, 5, 20, 1, 10];
+  const out = [];
+  for await (const value of mapConcurrentOrdered(delays, 2, async (delay, index) => {
+    active += 1;
+    peak = Math.max(peak, active);
+    await new Promise((resolve) => setTimeout(resolve, delay));
+    active -= 1;
+    return index;
+  })) {
+    out.push(value);
+  }
+  assert.deepEqual(out, [0, 1, 2, 3, 4]);
+  assert.equal(peak, 2);
+});
+
 test('oauthResultFromPaste parses full callback URL', () => {
   const parsed = oauthResultFromPaste('http://127.0.0.1:8486/callback?code=abc123&state=s1');
   assert.ok(parsed);
@@ -147,7 +178,11 @@ test('requestJson 4xx includes trace id and error details', async (t) => {
 });
 
 test('requestJson 4xx falls back to response text when JSON is invalid', async (t) => {
-  withFetchMock(t, async () => new Response('bad request body', { status: 400 }));
+  let calls = 0;
+  withFetchMock(t, async () => {
+    calls += 1;
+    return new Response('bad request body', { status: 400 });
+  });
 
   await assert.rejects(
     () => requestJson('https://example.test/endpoint'),
@@ -157,6 +192,28 @@ test('requestJson 4xx falls back to response text when JSON is invalid', async (
       return true;
     },
   );
+  assert.equal(calls, 1);
+});
+
+test('requestJson reads only the head of a large error body', async (t) => {
+  let pulls = 0;
+  withFetchMock(t, async () => new Response(new ReadableStream({
+    pull(controller) {
+      pulls += 1;
+      controller.enqueue(new TextEncoder().encode(pulls === 1 ? 'upstream exploded ' : 'x'.repeat(16 * 1024)));
+    },
+  }), { status: 400 }));
+
+  await assert.rejects(
+    () => requestJson('https://example.test/endpoint'),
+    (err) => {
+      assert.match(String(err.message), /HTTP 400/);
+      assert.match(String(err.message), /upstream exploded/);
+      assert.equal(err.body, null);
+      return true;
+    },
+  );
+  assert.ok(pulls < 10);
 });
 
 test('requestJson retries network errors up to max attempts', async (t) => {
@@ -183,3 +240,241 @@ test('requestJson raises when success response is not JSON', async (t) => {
     /Expected JSON response/,
   );
 });
+
+test('requestJson returns an empty object for 204 without reading the body', async (t) => {
+  withFetchMock(t, async () => {
+    const response = new Response(null, { status: 204 });
+    response.text = async () => {
+      throw new Error('204 body should not be read');
+    };
+    return response;
+  });
+
+  assert.deepEqual(await requestJson('https://example.test/endpoint', { method: 'DELETE' }), {});
+});
+
+test('requestJson passes caller headers through without mutating them', async (t) => {
+  const seen = [];
+  withFetchMock(t, async (input, options) => {
+    seen.push(options.headers);
+    return jsonResponse({ ok: true });
+  });
+
+  const headers = { Authorization: 'Bearer token' };
+  await requestJson('https://example.test/endpoint', { headers });
+  await requestJson('https://example.test/endpoint', { method: 'POST', headers, data: { a: 1 } });
+
+  assert.equal(seen[0], headers);
+  assert.deepEqual(seen[1], { Authorization: 'Bearer token', 'Content-Type': 'application/x-www-form-urlencoded' });
+  assert.deepEqual(headers, { Authorization: 'Bearer token' });
+});
+
+test('requestJson stops retrying once the caller aborts', async (t) => {
+  let calls = 0;
+  withFetchMock(t, async () => {
+    calls += 1;
+    return jsonResponse({ error: 'unavailable' }, { status: 503 });
+  });
+
+  const aborter = new AbortController();
+  const pending = requestJson('https://example.test/endpoint', {
+    retries: 5,
+    retryBackoffMs: 60000,
+    signal: aborter.signal,
+  });
+  await new Promise((resolve) => setTimeout(resolve, 20));
+  aborter.abort();
+
+  await assert.rejects(pending, { name: 'AbortError' });
+  assert.equal(calls, 1);
+});
+
+test('requestJson does not wait out the backoff when aborted while draining a retry', async (t) => {
+  withFetchMock(t, async () => new Response(new ReadableStream({
+    async pull(controller) {
+      await new Promise((resolve) => setTimeout(resolve, 50));
+      controller.close();
+    },
+  }), { status: 503 }));
+
+  const aborter = new AbortController();
+  const startedAt = Date.now();
+  const pending = requestJson('https://example.test/endpoint', {
+    retries: 3,
+    retryBackoffMs: 3000,
+    signal: aborter.signal,
+  });
+  setTimeout(() => aborter.abort(), 10);
+
+  await assert.rejects(pending, { name: 'AbortError' });
+  assert.ok(Date.now() - startedAt < 1000);
+});
+
+test('sha256Hex hashes strings and buffers identically', () => {
+  const expected = 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad';
+  assert.equal(sha256Hex('abc'), expected);
+  assert.equal(sha256Hex(Buffer.from('abc', 'utf8')), expected);
+});
+
+test('stableJsonStringify sorts keys recursively and rejects cycles', () => {
+  const shared = { z: 1, a: [3, { y: null, b: undefined }] };
+  assert.equal(
+    stableJsonStringify({ b: shared, a: shared, c: [undefined] }),
+    '{"a":{"a":[3,{"y":null}],"z":1},"b":{"a":[3,{"y":null}],"z":1},"c":[null]}',
+  );
+
+  const cyclic = { a: 1 };
+  cyclic.self = cyclic;
+  assert.throws(() => stableJsonStringify(cyclic), /circular/);
+});
+
+test('memoized date parsing returns fresh Date objects', () => {
+  clearDateParseCache();
+  const first = isoToDate('2026-02-11T08:30:00Z');
+  first.setUTCFullYear(2000);
+  assert.equal(isoToDate('2026-02-11T08:30:00Z').toISOString(), '2026-02-11T08:30:00.000Z');
+  assert.equal(toEpochSeconds('2026-02-11'), 1770768000);
+  assert.equal(isoToDate('2026-02-11').toISOString(), '2026-02-11T00:00:00.000Z');
+  assert.equal(isoToDate('not a date'), null);
+  assert.equal(toEpochSeconds('not a date'), null);
+});
+
+test('toEpochSeconds parses YYYY-MM-DD dates as UTC midnight', () => {
+  clearDateParseCache();
+  assert.equal(toEpochSeconds('1970-01-02'), 86400);
+  assert.equal(toEpochSeconds('0050-01-01'), Date.parse('0050-01-01T00:00:00Z') / 1000);
+  assert.equal(toEpochSeconds('2026-13-01'), null);
+  assert.equal(toEpochSeconds('2026-02-00'), null);
+});
+
+test('parseRedirectUri derives listen settings and caches results', () => {
+  const redirect = parseRedirectUri('http://localhost:8486/callback');
+  assert.deepEqual({ ...redirect }, {
+    host: 'localhost',
+    port: 8486,
+    path: '/callback',
+    uri: 'http://localhost:8486/callback',
+  });
+  assert.equal(parseRedirectUri('http://localhost:8486/callback'), redirect);
+  assert.equal(parseRedirectUri('https://example.test/cb').port, 443);
+});
+
+test('epochToIsoZ formats whole epoch seconds as ISO-8601 Z strings', () => {
+  assert.equal(epochToIsoZ(1770715852), '2026-02-10T09:30:52Z');
+  assert.equal(epochToIsoZ('1770715852'), '2026-02-10T09:30:52Z');
+  assert.equal(epochToIsoZ(1770715852.9), '2026-02-10T09:30:52Z');
+  assert.equal(epochToIsoZ(0), '1970-01-01T00:00:00Z');
+  assert.equal(epochToIsoZ(null), null);
+  assert.equal(epochToIsoZ('not-a-number'), null);
+  assert.equal(epochToIsoZ(1e20), null);
+});
+
+test('oauthStateMismatch accepts matching or absent state only', () => {
+  assert.equal(oauthStateMismatch('abc123', 'abc123'), false);
+  assert.equal(oauthStateMismatch(null, 'abc123'), false);
+  assert.equal(oauthStateMismatch('', 'abc123'), false);
+  assert.equal(oauthStateMismatch('abc124', 'abc123'), true);
+  assert.equal(oauthStateMismatch('abc', 'abc123'), true);
+});
+
+test('splitScopes splits on commas and whitespace and drops empty parts', () => {
+  assert.deepEqual(splitScopes('read, activity:read_all  profile'), ['read', 'activity:read_all', 'profile']);
+  assert.deepEqual(splitScopes(' ,, '), []);
+  assert.deepEqual(splitScopes(null), []);
+});
+
+test('requestJson retries fetch-level network failures but not non-JSON responses', async (t) => {
+  let calls = 0;
+  withFetchMock(t, async () => {
+    calls += 1;
+    if (calls === 1) {
+      throw new TypeError('fetch failed', { cause: { code: 'ECONNREFUSED' } });
+    }
+    return new Response('not json', { status: 200 });
+  });
+
+  await assert.rejects(
+    () => requestJson('https://example.test/endpoint', { retries: 3, retryBackoffMs: 0 }),
+    /Expected JSON response/,
+  );
+  assert.equal(calls, 2);
+});
+
+test('requestJson does not retry certificate, DNS or programming errors', async (t) => {
+  let thrown = null;
+  let calls = 0;
+  withFetchMock(t, async () => {
+    calls += 1;
+    throw thrown;
+  });
+
+  for (const error of [
+    new TypeError('fetch failed', { cause: { code: 'CERT_HAS_EXPIRED' } }),
+    new TypeError('fetch failed', { cause: { code: 'ENOTFOUND' } }),
+    new TypeError('Invalid header value'),
+  ]) {
+    thrown = error;
+    calls = 0;
+    await assert.rejects(
+      () => requestJson('https://example.test/endpoint', { retries: 3, retryBackoffMs: 0 }),
+      (err) => err === thrown,
+    );
+    assert.equal(calls, 1, thrown.cause?.code || thrown.message);
+  }
+});
+
+test('requestJson retries attempts that time out', async (t) => {
+  let requests = 0;
+  const server = http.createServer(() => {
+    requests += 1;
+  });
+  await new Promise((resolve) => server.listen(0, '127.0.0.1', resolve));
+  t.after(() => {
+    server.closeAllConnections();
+    server.close();
+  });
+
+  await assert.rejects(
+    () => requestJson(`http://127.0.0.1:${server.address().port}/hang`, {
+      timeoutMs: 100,
+      retries: 3,
+      retryBackoffMs: 0,
+    }),
+    /timed out after 100ms/,
+  );
+  assert.equal(requests, 3);
+});
+
+test('oauthListenForCode closes the callback connection so it resolves promptly', async () => {
+  let callbackUrl = null;
+  const pending = oauthListenForCode({
+    listenPort: 0,
+    timeoutSeconds: 5,
+    onStatus: (line) => {
+      callbackUrl = line.split(' on ')[1];
+    },
+  });
+  while (!callbackUrl) {
+    await new Promise((resolve) => setImmediate(resolve));
+  }
+
+  const agent = new http.Agent({ keepAlive: true });
+  const connection = await new Promise((resolve, reject) => {
+    http.get(`${callbackUrl}?code=abc&state=xyz`, { agent }, (res) => {
+      res.resume();
+      res.on('end', () => resolve(res.headers.connection));
+    }).on('error', reject);
+  });
+  const result = await pending;
+  agent.destroy();
+
+  assert.equal(connection, 'close');
+  assert.equal(result.code, 'abc');
+  assert.equal(result.state, 'xyz');
+});
+
+test('dtToIsoZ and utcNowIso drop milliseconds', () => {
+  assert.equal(dtToIsoZ('2026-02-10T12:34:56.789Z'), '2026-02-10T12:34:56Z');
+  assert.equal(dtToIsoZ('2026-02-10T14:34:56+02:00'), '2026-02-10T12:34:56Z');
+  assert.match(utcNowIso(), /^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z$/);
+});
@@ -4,6 +4,7 @@ import test from 'node:test';
 import { HealthSyncDb } from '../src/db.js';
 import { PluginHelpers } from '../src/plugins/base.js';
 import withingsProvider from '../src/providers/withings.js';
+import { sha256Hex } from '../src/util.js';
 import {
   baseConfig,
   dbPathFor,
@@ -34,6 +35,17 @@ function withDbAndConfig(t, withingsOverrides = {}) {
   return { db, config, helpers };
 }
 
+function seedLiveToken(db, overrides = {}) {
+  db.setOAuthToken('withings', {
+    accessToken: 'live-access',
+    refreshToken: null,
+    tokenType: 'Bearer',
+    scope: 'user.metrics,user.activity',
+    expiresAt: null,
+    ...overrides,
+  });
+}
+
 function bodyParams(options) {
   if (!options?.body) {
     return new URLSearchParams();
@@ -109,6 +121,8 @@ test('withings expired oauth token is refreshed and persisted', async (t) => {
   assert.equal(token.refreshToken, 'new-refresh');
   assert.equal(token.scope, 'user.metrics,user.activity');
   assert.ok(token.expiresAt);
+  assert.ok(Math.abs(token.expiresAtEpoch - (Math.floor(Date.now() / 1000) + 3600)) <= 5);
+  assert.equal(token.expiresAtEpoch, Date.parse(token.expiresAt) / 1000);
 });
 
 test('withings sync raises helpful error when oauth token is missing', async (t) => {
@@ -149,3 +163,320 @@ test('withings failed refresh response raises error', async (t) => {
     /Withings token refresh failed/,
   );
 });
+
+test('withings fetches resources concurrently and stores each in its own run', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t);
+  seedLiveToken(db, { refreshToken: 'live-refresh', expiresAt: '2099-01-01T00:00:00Z' });
+
+  const requested = [];
+  let releaseMeasures = null;
+  const measuresGate = new Promise((resolve) => {
+    releaseMeasures = resolve;
+    setTimeout(resolve, 200);
+  });
+  withFetchMock(t, async (input, options = {}) => {
+    const params = bodyParams(options);
+    const action = params.get('action');
+    requested.push(params.get('offset') ? `${action}@${params.get('offset')}` : action);
+    if (requested.length === 4) {
+      releaseMeasures();
+    }
+    if (action === 'getmeas') {
+      await measuresGate;
+      if (params.get('offset') === '1') {
+        return jsonResponse({
+          status: 0,
+          body: { measuregrps: [{ grpid: 2, date: 1770700000 }], more: 0, updatetime: 1770715852 },
+        });
+      }
+      return jsonResponse({
+        status: 0,
+        body: { measuregrps: [{ grpid: 1, date: 1770600000 }], more: 1, offset: 1, updatetime: 1770715852 },
+      });
+    }
+    if (action === 'getactivity') {
+      return jsonResponse({ status: 0, body: { activities: [{ date: '2026-02-10', steps: 1000 }], more: 0 } });
+    }
+    if (action === 'getworkouts') {
+      return jsonResponse({ status: 0, body: { series: [{ id: 7, startdate: 1770600000 }], more: 0 } });
+    }
+    if (action === 'getsummary') {
+      return jsonResponse({ status: 0, body: { series: [{ id: 9, startdate: 1770600000 }], more: 0 } });
+    }
+    throw new Error(`Unexpected action: ${action}`);
+  });
+
+  await withingsProvider.sync(db, config, helpers);
+
+  assert.deepEqual(requested.slice(0, 4).sort(), ['getactivity', 'getmeas', 'getsummary', 'getworkouts']);
+  assert.equal(requested[4], 'getmeas@1');
+  const counts = Object.fromEntries(db.conn.prepare(`
+    SELECT resource, COUNT(*) AS n FROM records WHERE provider = 'withings' GROUP BY resource
+  `).all().map((row) => [row.resource, row.n]));
+  assert.deepEqual(counts, { activity: 1, measures: 2, sleep_summary: 1, workouts: 1 });
+  const measuresState = db.conn.prepare(`
+    SELECT watermark, watermark_epoch FROM sync_state WHERE provider = 'withings' AND resource = 'measures'
+  `).get();
+  assert.ok(Number.isInteger(measuresState.watermark_epoch));
+  assert.equal(Date.parse(measuresState.watermark) / 1000, measuresState.watermark_epoch);
+  const runs = db.listRecentSyncRuns(10).filter((run) => run.provider === 'withings');
+  assert.equal(runs.length, 4);
+  assert.ok(runs.every((run) => run.status === 'success' && run.insertedCount > 0));
+});
+
+test('withings skips resources synced within min_poll_interval_seconds', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t);
+  seedLiveToken(db);
+
+  const actions = [];
+  withFetchMock(t, async (input, options = {}) => {
+    const action = bodyParams(options).get('action');
+    actions.push(action);
+    if (action === 'getmeas') {
+      return jsonResponse({ status: 0, body: { measuregrps: [], more: 0, updatetime: 1770715852 } });
+    }
+    if (action === 'getactivity') {
+      return jsonResponse({ status: 0, body: { activities: [], more: 0 } });
+    }
+    return jsonResponse({ status: 0, body: { series: [], more: 0 } });
+  });
+
+  await withingsProvider.sync(db, config, helpers);
+  assert.equal(actions.length, 4);
+
+  const originalLog = console.log;
+  console.log = () => {};
+  try {
+    await withingsProvider.sync(db, config, helpers);
+  } finally {
+    console.log = originalLog;
+  }
+  assert.equal(actions.length, 4);
+
+  const eager = new PluginHelpers(baseConfig({
+    withings: { ...config.withings, min_poll_interval_seconds: 0 },
+  }));
+  await withingsProvider.sync(db, config, eager);
+  assert.equal(actions.length, 8);
+});
+
+test('withings resumes an interrupted backfill from the checkpointed offset', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, { min_poll_interval_seconds: 0 });
+  seedLiveToken(db);
+
+  let failSecondPage = true;
+  const measureCalls = [];
+  withFetchMock(t, async (input, options = {}) => {
+    const params = bodyParams(options);
+    const action = params.get('action');
+    if (action === 'getmeas') {
+      measureCalls.push({ offset: params.get('offset'), lastupdate: params.get('lastupdate') });
+      if (params.get('offset') === '5') {
+        if (failSecondPage) {
+          return jsonResponse({ status: 601, error: 'Too many requests' });
+        }
+        return jsonResponse({
+          status: 0,
+          body: { measuregrps: [{ grpid: 2, date: 1770700000 }], more: 0, updatetime: 4102444800 },
+        });
+      }
+      return jsonResponse({
+        status: 0,
+        body: { measuregrps: [{ grpid: 1, date: 1770600000 }], more: 1, offset: 5, updatetime: 4102444800 },
+      });
+    }
+    if (action === 'getactivity') {
+      return jsonResponse({ status: 0, body: { activities: [], more: 0 } });
+    }
+    return jsonResponse({ status: 0, body: { series: [], more: 0 } });
+  });
+
+  await assert.rejects(() => withingsProvider.sync(db, config, helpers), /measures sync failed/);
+  const interrupted = db.getSyncState('withings', 'measures');
+  assert.equal(interrupted.cursor, '5');
+  assert.equal(interrupted.watermark, null);
+  assert.ok(db.conn.prepare(`
+    SELECT 1 FROM records WHERE provider = 'withings' AND resource = 'measures' AND record_id = '1'
+  `).get());
+
+  failSecondPage = false;
+  await withingsProvider.sync(db, config, helpers);
+
+  assert.deepEqual(measureCalls.map((call) => call.offset), [null, '5', '5']);
+  assert.equal(measureCalls[2].lastupdate, measureCalls[0].lastupdate);
+  const finished = db.getSyncState('withings', 'measures');
+  assert.equal(finished.cursor, null);
+  assert.equal(finished.watermarkEpoch, interrupted.extra.started_at);
+  assert.ok(db.conn.prepare(`
+    SELECT 1 FROM records WHERE provider = 'withings' AND resource = 'measures' AND record_id = '2'
+  `).get());
+});
+
+test('withings fallback record ids keep the legacy hash of the payload', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, { min_poll_interval_seconds: 0 });
+  seedLiveToken(db);
+
+  const measuregrps = [{ date: 1770600000, category: 1 }];
+  withFetchMock(t, async (input, options = {}) => {
+    const action = bodyParams(options).get('action');
+    if (action === 'getmeas') {
+      return jsonResponse({ status: 0, body: { measuregrps, more: 0, updatetime: 1770715852 } });
+    }
+    if (action === 'getactivity') {
+      return jsonResponse({ status: 0, body: { activities: [], more: 0 } });
+    }
+    return jsonResponse({ status: 0, body: { series: [], more: 0 } });
+  });
+
+  const legacyId = sha256Hex(JSON.stringify(measuregrps[0]));
+  db.upsertRecord({
+    provider: 'withings',
+    resource: 'measures',
+    recordId: legacyId,
+    payload: { date: 1770600000 },
+  });
+
+  await withingsProvider.sync(db, config, helpers);
+
+  const rows = db.conn.prepare(`
+    SELECT record_id, payload_json FROM records WHERE provider = 'withings' AND resource = 'measures'
+  `).all();
+  assert.equal(rows.length, 1);
+  assert.equal(rows[0].record_id, legacyId);
+  assert.equal(rows[0].payload_json, '{"category":1,"date":1770600000}');
+});
+
+test('withings refreshes once and refetches when the api rejects a cached token', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, { min_poll_interval_seconds: 0 });
+  seedLiveToken(db, {
+    accessToken: 'revoked-access',
+    refreshToken: 'live-refresh',
+    expiresAt: '2099-01-01T00:00:00Z',
+  });
+
+  let refreshCalls = 0;
+  const authorizations = new Set();
+  withFetchMock(t, async (input, options = {}) => {
+    const url = input instanceof URL ? input : new URL(String(input));
+    if (url.pathname.endsWith('/v2/signature')) {
+      return jsonResponse({ status: 0, body: { nonce: 'nonce-1' } });
+    }
+    if (url.pathname.endsWith('/v2/oauth2')) {
+      refreshCalls += 1;
+      return jsonResponse({
+        status: 0,
+        body: { access_token: 'new-access', refresh_token: 'new-refresh', expires_in: 3600 },
+      });
+    }
+    authorizations.add(options.headers.Authorization);
+    if (options.headers.Authorization !== 'Bearer new-access') {
+      return jsonResponse({ status: 401, error: 'invalid_token' });
+    }
+    const action = bodyParams(options).get('action');
+    if (action === 'getmeas') {
+      return jsonResponse({ status: 0, body: { measuregrps: [{ grpid: 1, date: 1770600000 }], more: 0 } });
+    }
+    if (action === 'getactivity') {
+      return jsonResponse({ status: 0, body: { activities: [], more: 0 } });
+    }
+    return jsonResponse({ status: 0, body: { series: [], more: 0 } });
+  });
+
+  await withingsProvider.sync(db, config, helpers);
+  assert.equal(refreshCalls, 1);
+  assert.deepEqual([...authorizations].sort(), ['Bearer new-access', 'Bearer revoked-access']);
+  assert.equal(db.getOAuthToken('withings').accessToken, 'new-access');
+  assert.equal(db.getSyncState('withings', 'measures').cursor, null);
+
+  authorizations.clear();
+  await withingsProvider.sync(db, config, helpers);
+  assert.equal(refreshCalls, 1);
+  assert.deepEqual([...authorizations], ['Bearer new-access']);
+});
+
+test('withings requests at most one page ahead of the writer', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, { min_poll_interval_seconds: 0 });
+  seedLiveToken(db);
+
+  // Slow the writer down so a runaway prefetch would get well ahead of it.
+  const transaction = db.transaction.bind(db);
+  db.transaction = async (fn) => {
+    await new Promise((resolve) => setTimeout(resolve, 10));
+    return transaction(fn);
+  };
+
+  const storedWhenRequested = [];
+  withFetchMock(t, async (input, options = {}) => {
+    const params = bodyParams(options);
+    const action = params.get('action');
+    if (action === 'getmeas') {
+      const offset = Number(params.get('offset') || 0);
+      storedWhenRequested.push([offset, db.conn.prepare(`
+        SELECT COUNT(*) AS n FROM records WHERE provider = 'withings' AND resource = 'measures'
+      `).get().n]);
+      const more = offset < 5 ? 1 : 0;
+      return jsonResponse({
+        status: 0,
+        body: { measuregrps: [{ grpid: offset + 1, date: 1770600000 }], more, offset: offset + 1 },
+      });
+    }
+    if (action === 'getactivity') {
+      return jsonResponse({ status: 0, body: { activities: [], more: 0 } });
+    }
+    return jsonResponse({ status: 0, body: { series: [], more: 0 } });
+  });
+
+  await withingsProvider.sync(db, config, helpers);
+
+  assert.equal(storedWhenRequested.length, 6);
+  for (const [offset, stored] of storedWhenRequested) {
+    assert.ok(stored >= offset - 1, `page ${offset} requested with only ${stored} pages stored`);
+  }
+});
+
+test('withings stops paging other resources after one fails', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, { min_poll_interval_seconds: 0 });
+  seedLiveToken(db);
+
+  let activityCalls = 0;
+  withFetchMock(t, async (input, options = {}) => {
+    const params = bodyParams(options);
+    const action = params.get('action');
+    if (action === 'getmeas') {
+      return jsonResponse({ status: 503, error: 'Service unavailable' });
+    }
+    if (action === 'getactivity') {
+      activityCalls += 1;
+      const offset = Number(params.get('offset') || 0);
+      return jsonResponse({
+        status: 0,
+        body: { activities: [{ date: `2026-01-${String(offset + 1).padStart(2, '0')}` }], more: offset < 40 ? 1 : 0, offset: offset + 1 },
+      });
+    }
+    return jsonResponse({ status: 0, body: { series: [], more: 0 } });
+  });
+
+  await assert.rejects(() => withingsProvider.sync(db, config, helpers), /measures sync failed/);
+  await new Promise((resolve) => setTimeout(resolve, 50));
+  assert.equal(activityCalls, 1);
+});
+
+test('withings aborts requests still in flight for other resources when one fails', async (t) => {
+  const { db, config, helpers } = withDbAndConfig(t, { min_poll_interval_seconds: 0 });
+  seedLiveToken(db);
+
+  const signals = [];
+  withFetchMock(t, async (input, options = {}) => {
+    if (bodyParams(options).get('action') === 'getmeas') {
+      return jsonResponse({ status: 503, error: 'Service unavailable' });
+    }
+    signals.push(options.signal);
+    return new Promise((resolve, reject) => {
+      options.signal.addEventListener('abort', () => reject(options.signal.reason), { once: true });
+    });
+  });
+
+  await assert.rejects(() => withingsProvider.sync(db, config, helpers), /measures sync failed/);
+  assert.equal(signals.length, 3);
+  assert.ok(signals.every((signal) => signal.aborted));
+});